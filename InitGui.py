@@ -28,21 +28,35 @@ global PIE_MENU_VERSION
 PIE_MENU_VERSION = "1.2.7"
 
 def pieMenuStart():
+    import __main__
+    import base64
+    import collections
+    import json
     import math
     import operator
+    import os
     import platform
+    import time
+    import traceback
     import FreeCAD as App
     import FreeCADGui as Gui
     from PySide import QtCore
     from PySide import QtGui
+    import PieMenuCore as core
     import PieMenuLocator as locator
+    import PieMenuRecorder as recorder
+    import PieMenuStats as stats
 
     path = locator.path()
     respath = path + "/Resources/icons/"
     
     # global status variables
-    selectionTriggered = False
-    contextPhase = False
+    commandCacheLoaded = False
+    usageLoaded = False
+    usageHalfLife = 14 * 86400
+    loadingWorkbenches = False
+    lastAction = None
+    workbenchPiesDirty = True
 
     def remObsoleteParams():
         """Remove obsolete parameters from older versions."""
@@ -99,6 +113,10 @@ def pieMenuStart():
             background-color: lightBlue;
         }
 
+        QToolButton:pressed {
+            background-color: lightBlue;
+        }
+
         QToolButton:checked {
             background-color: lightGreen;
         }
@@ -125,6 +143,30 @@ def pieMenuStart():
 
     styleContainer = ("QMenu{background: transparent}")
 
+    styleBadge = ("""
+        QLabel {
+            background-color: rgba(60,60,60,200);
+            color: silver;
+            border-radius: 3px;
+            font-size: 8px;
+            padding: 0px 2px 0px 2px;
+        }
+
+        """)
+
+    # keyboard accelerators of the slices in slot order
+    acceleratorKeys = "1234567890ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+    styleSearch = ("""
+        QLineEdit {
+            background-color: rgba(60,60,60,255);
+            color: silver;
+            border: 1px solid #1e1e1e;
+            border-radius: 4px;
+        }
+
+        """)
+
     styleCombo = ("""
         QComboBox {
             background: transparent;
@@ -151,6 +193,9 @@ def pieMenuStart():
     iconRename = respath + "PieMenuRename.svg"
     iconCopy = respath + "PieMenuCopy.svg"
     iconRemoveCommand = respath + "PieMenuRemoveCommand.svg"
+    iconBack = respath + "PieMenuUp.svg"
+    iconSubPie = respath + "PieMenu_Logo.svg"
+    iconDial = respath + "PieMenuEditMenu.svg"
 
 
     def radiusSize(buttonSize):
@@ -167,6 +212,73 @@ def pieMenuStart():
         return icon
 
 
+    layoutCache = {}
+
+
+    def pieLayout(count, radius, buttonSize):
+        """Return the button size and slots of a pie with count commands.
+
+        Layouts are cached per configuration.
+        """
+        paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+        minButton = min(paramGet.GetInt("ButtonMinimum", 24), buttonSize)
+        maxRings = max(paramGet.GetInt("MaxRings", 3), 1)
+
+        key = (count, radius, buttonSize, minButton, maxRings)
+
+        if key not in layoutCache:
+            layoutCache[key] = core.pieLayout(count, radius, buttonSize,
+                                              minButton, maxRings)
+        else:
+            pass
+
+        return layoutCache[key]
+
+
+    def pageButton(pages, buttonSize=20):
+
+        radius = radiusSize(buttonSize)
+
+        button = QtGui.QToolButton()
+        button.setProperty("ButtonX", 0)
+        button.setProperty("ButtonY", -32)
+        button.setGeometry(0, 0, buttonSize, buttonSize)
+        button.setStyleSheet(styleMenuClose + radius)
+        button.setAttribute(QtCore.Qt.WA_TranslucentBackground)
+        button.setText("1/" + str(pages))
+
+        return button
+
+
+    def acceleratorBadge(button, number):
+        """Assign the accelerator of the slot number and show it as a badge."""
+        if number < len(acceleratorKeys):
+            text = acceleratorKeys[number]
+        else:
+            text = None
+
+        button.setProperty("Accelerator", text)
+        badge = button.findChild(QtGui.QLabel)
+
+        if text is None:
+            if badge is not None:
+                badge.hide()
+            else:
+                pass
+            return
+
+        if badge is None:
+            badge = QtGui.QLabel(button)
+            badge.setStyleSheet(styleBadge)
+            badge.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
+        else:
+            pass
+
+        badge.setText(text)
+        badge.adjustSize()
+        badge.show()
+
+
     def closeButton(buttonSize=32):
 
         icon = iconSize(buttonSize)
@@ -183,13 +295,31 @@ def pieMenuStart():
 
         def onButton():
 
-            PieMenuInstance.hide()
+            PieMenuInstance.back()
 
         button.clicked.connect(onButton)
 
         return button
 
 
+    def repeatButton(buttonSize=20):
+        """Return the centre slot repeating the last pie command."""
+        icon = iconSize(buttonSize)
+        radius = radiusSize(buttonSize)
+
+        button = HoverButton()
+        button.setDefaultAction(repeatAction)
+        button.setProperty("ButtonX", 32)
+        button.setProperty("ButtonY", 0)
+        button.setProperty("Repeat", True)
+        button.setGeometry(0, 0, buttonSize, buttonSize)
+        button.setIconSize(QtCore.QSize(icon, icon))
+        button.setStyleSheet(styleMenuClose + radius)
+        button.setAttribute(QtCore.Qt.WA_TranslucentBackground)
+
+        return button
+
+
     def quickMenu(buttonSize=20):
 
         icon = iconSize(buttonSize)
@@ -210,7 +340,7 @@ def pieMenuStart():
         button.setPopupMode(QtGui.QToolButton
                             .ToolButtonPopupMode.InstantPopup)
 
-        menuMode = QtGui.QMenu()
+        menuMode = QtGui.QMenu(menu)
         menuMode.setTitle("Trigger")
 
         modeGroup = QtGui.QActionGroup(menuMode)
@@ -226,24 +356,40 @@ def pieMenuStart():
         actionHover.setData("Hover")
         actionHover.setCheckable(True)
 
+        actionGesture = QtGui.QAction(modeGroup)
+        actionGesture.setText("Gesture")
+        actionGesture.setData("Gesture")
+        actionGesture.setCheckable(True)
+
         menuMode.addAction(actionPress)
         menuMode.addAction(actionHover)
+        menuMode.addAction(actionGesture)
 
         actionContext = QtGui.QAction(menu)
         actionContext.setText("Context")
         actionContext.setCheckable(True)
 
-        menuPieMenu = QtGui.QMenu()
+        actionChain = QtGui.QAction(menu)
+        actionChain.setText("Chain")
+        actionChain.setToolTip("Keep the pie open and recompute once when it is closed")
+        actionChain.setCheckable(True)
+
+        actionDynamic = QtGui.QAction(menu)
+        actionDynamic.setText("Dynamic")
+        actionDynamic.setToolTip("Show the commands active for the selection")
+        actionDynamic.setCheckable(True)
+
+        menuPieMenu = QtGui.QMenu(menu)
         menuPieMenu.setTitle("PieMenu")
 
         pieGroup = QtGui.QActionGroup(menu)
         pieGroup.setExclusive(True)
 
-        menuToolBar = QtGui.QMenu()
+        menuToolBar = QtGui.QMenu(menu)
         menuToolBar.setTitle("ToolBar")
         menuToolBar.setStyleSheet(styleQuickMenuItem)
 
-        toolbarGroup = QtGui.QMenu()
+        toolbarGroup = QtGui.QMenu(menu)
 
         toolbarGroupOps = QtGui.QActionGroup(toolbarGroup)
         toolbarGroupOps.setExclusive(True)
@@ -262,6 +408,8 @@ def pieMenuStart():
 
             if paramGet.GetString("TriggerMode") == "Hover":
                 actionHover.setChecked(True)
+            elif paramGet.GetString("TriggerMode") == "Gesture":
+                actionGesture.setChecked(True)
             else:
                 actionPress.setChecked(True)
 
@@ -270,15 +418,22 @@ def pieMenuStart():
             else:
                 pass
 
+            actionChain.setChecked(paramGet.GetBool("ChainMode"))
+            actionDynamic.setChecked(paramGet.GetBool("DynamicPie"))
+
         setChecked()
+        # the pie may be reused, keep the check marks current
+        menu.aboutToShow.connect(setChecked)
+        menu.triggered.connect(lambda action:
+                               recorder.recordQuick(menu, action))
 
         def onModeGroup():
             paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
             text = modeGroup.checkedAction().data()
             paramGet.SetString("TriggerMode", text)
 
-            PieMenuInstance.hide()
-            PieMenuInstance.showAtMouse(notKeyTriggered=True)
+            # the trigger mode does not change the pie
+            PieMenuInstance.refresh(rebuild=False)
 
         modeGroup.triggered.connect(onModeGroup)
 
@@ -295,6 +450,22 @@ def pieMenuStart():
 
         actionContext.triggered.connect(onActionContext)
 
+        def onActionChain():
+            paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+            paramGet.SetBool("ChainMode", actionChain.isChecked())
+
+            PieMenuInstance.refresh(rebuild=False)
+
+        actionChain.triggered.connect(onActionChain)
+
+        def onActionDynamic():
+            paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+            paramGet.SetBool("DynamicPie", actionDynamic.isChecked())
+
+            PieMenuInstance.refresh(rebuild=False)
+
+        actionDynamic.triggered.connect(onActionDynamic)
+
         def pieList():
             paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
             paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
@@ -358,48 +529,42 @@ def pieMenuStart():
                 text = pieGroup.checkedAction().text()
                 paramGet.SetString("CurrentPie", text)
 
-            PieMenuInstance.hide()
-            PieMenuInstance.showAtMouse(notKeyTriggered=True)
+            PieMenuInstance.refresh(state="Normal")
 
         pieGroup.triggered.connect(onPieGroup)
 
         def onMenuToolBar():
-            paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
 
-            menuToolBar.clear()
+            titles = toolBarIndex.catalogue()
 
-            if paramGet.GetBool("ToolBar"):
-                text = paramGet.GetString("ToolBar")
-                if ": " in text:
-                    toolbar_desc = text.split(": ")
-                    text = toolbar_desc[1]
-                else:
-                    pass
-            else:
-                text = None
+            if menuToolBar.property("Generation") == toolBarIndex.generation:
+                return
 
-            for i in mw.findChildren(QtGui.QToolBar):
+            menuToolBar.setProperty("Generation", toolBarIndex.generation)
 
-                commands = []
+            for i in menuToolBar.findChildren(QtGui.QMenu):
+                i.deleteLater()
 
-                for a in i.findChildren(QtGui.QToolButton):
-                    try:
-                        if not a.defaultAction().isSeparator():
-                            commands.append(a.defaultAction())
-                        else:
-                            pass
-                    except AttributeError:
-                        pass
+            menuToolBar.clear()
 
-                if len(commands) != 0:
-                    menu = QtGui.QMenu(i.windowTitle())
-                    menu.aboutToShow.connect(lambda sender=menu: onMenuToolbarGroup(sender))
-                    menuToolBar.addMenu(menu)
-                else:
-                    pass
+            for i in titles:
+                action = QtGui.QAction(menuToolBar)
+                action.setText(i)
+                menuToolBar.addAction(action)
 
         menuToolBar.aboutToShow.connect(onMenuToolBar)
 
+        def onMenuToolBarHovered(action):
+            # submenus are created when first hovered
+            if action.menu() is None:
+                menu = QtGui.QMenu(action.text(), menuToolBar)
+                menu.aboutToShow.connect(lambda sender=menu: onMenuToolbarGroup(sender))
+                action.setMenu(menu)
+            else:
+                pass
+
+        menuToolBar.hovered.connect(onMenuToolBarHovered)
+
         def isActualPie(text):
 
             paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
@@ -422,8 +587,6 @@ def pieMenuStart():
                 action.setText("Show")
                 action.setData(sender.title())
                 action.setCheckable(True)
-                if isActualPie(sender.title()):
-                    action.setChecked(True)
                 sender.addAction(action)
 
                 action = QtGui.QAction(sender)
@@ -433,6 +596,9 @@ def pieMenuStart():
 
                 sender.triggered.connect(lambda sender: onToolbarGroup(sender))
 
+            # submenus are reused, keep the Show state current
+            sender.actions()[0].setChecked(isActualPie(sender.title()))
+
         def onToolbarGroup(sender):
                                                                      
             paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
@@ -455,9 +621,8 @@ def pieMenuStart():
                 getGuiToolButtonData(sender.data(), None, None, workbenches)
                 toolbar_desc = ", ".join(workbenches)
                 toolbar_desc = toolbar_desc + ': ' + sender.data()
-                paramGet.SetString("ToolBar", toolbar_desc)            
-                PieMenuInstance.hide()
-                PieMenuInstance.showAtMouse(notKeyTriggered=True)                   
+                paramGet.SetString("ToolBar", toolbar_desc)
+                PieMenuInstance.refresh(state="Normal")
 
         toolbarGroup.triggered.connect(onToolbarGroup)
 
@@ -470,6 +635,8 @@ def pieMenuStart():
 
         menu.addMenu(menuMode)
         menu.addAction(actionContext)
+        menu.addAction(actionChain)
+        menu.addAction(actionDynamic)
         menu.addSeparator()
         menu.addMenu(menuPieMenu)
         menu.addMenu(menuToolBar)
@@ -479,535 +646,2951 @@ def pieMenuStart():
         return button
 
 
-    class HoverButton(QtGui.QToolButton):
+    # decayed usage scores [score, time] per command, per pie index and
+    # for all pies together ("All")
+    usageStore = {}
+    usageDirty = set()
 
-        def __init__(self, parent=None):
-            super(HoverButton, self).__init__()
 
-        def enterEvent(self, event):
-            paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
-            mode = paramGet.GetString("TriggerMode")
-            if self.defaultAction().isEnabled() and mode == "Hover":
-                PieMenuInstance.hide()
-                self.defaultAction().trigger()
-            else:
-                pass
+    def loadUsage():
+        """Load the usage scores once per session."""
+        nonlocal usageLoaded
 
-        def mouseReleaseEvent(self, event):
-            paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
-            mode = paramGet.GetString("TriggerMode")
+        if usageLoaded:
+            return
 
-            if self.defaultAction().isEnabled():
-                PieMenuInstance.hide()
-                self.defaultAction().trigger()
-            else:
-                pass
+        usageLoaded = True
 
+        paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
 
-    class PieMenu:
+        readUsageHalfLife()
 
-        def __init__(self):
+        try:
+            usageStore.update(json.loads(paramGet.GetString("Usage") or "{}"))
+        except ValueError:
+            pass
 
-            self.radius = 100
-            self.buttons = []
-            self.buttonSize = 32
-            self.menu = QtGui.QMenu(mw)
-            self.menuSize = 0
-            self.menu.setStyleSheet(styleContainer)
-            self.menu.setWindowFlags(self.menu.windowFlags() | QtCore.Qt.FramelessWindowHint)
-            self.menu.setAttribute(QtCore.Qt.WA_TranslucentBackground)
 
-            if compositingManager:
-                pass
-            else:
-                self.menu.setAttribute(QtCore.Qt.WA_PaintOnScreen)
+    def readUsageHalfLife():
+        """Read the half life once, scores are decayed on every keystroke."""
+        nonlocal usageHalfLife
 
-        def add_commands(self, commands, context=False):
-            paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+        paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+        usageHalfLife = max(paramGet.GetInt("UsageHalfLife", 14), 1) * 86400
 
-            for i in self.buttons:
-                i.deleteLater()
 
-            self.buttons = []
+    def decayedScore(entry, now):
+        return core.decayedScore(entry, now, usageHalfLife)
 
-            if context:
-                group = getGroup(mode=2)
-            else:
-                group = getGroup(mode=1)
 
-            if len(commands) == 0:
-                commandNumber = 1
-            else:
-                commandNumber = len(commands)
+    def usageScore(command, pie="All", now=None):
+        """Return the decayed usage score of the command in the pie."""
+        loadUsage()
 
-            valueRadius = group.GetInt("Radius")
-            valueButton = group.GetInt("Button")
+        scores = usageStore.get(pie, {})
 
-            if paramGet.GetBool("ToolBar"):
-                valueRadius = 100
-                valueButton = 32
+        if command in scores:
+            return decayedScore(scores[command], now or time.time())
+        else:
+            return 0
 
-            if valueRadius:
-                self.radius = valueRadius
-            else:
-                self.radius = 100
 
-            if valueButton:
-                self.buttonSize = valueButton
-            else:
-                self.buttonSize = 32
+    def recordUsage(command, pie=None):
+        """Count a use, the scores are written by the usage timer."""
+        loadUsage()
 
-            if commandNumber == 1:
-                angle = 0
-                buttonSize = self.buttonSize
-            else:
-                angle = 2 * math.pi / commandNumber
-                buttonRadius = math.sin(angle / 2) * self.radius
-                buttonSize = math.trunc(2 * buttonRadius / math.sqrt(2))
+        now = time.time()
 
-            angleStart = 3 * math.pi / 2 - angle
+        for i in ["All", pie]:
+            if i is None:
+                continue
 
-            if buttonSize > self.buttonSize:
-                buttonSize = self.buttonSize
-            else:
-                pass
+            core.addUse(usageStore.setdefault(i, {}), command, now, usageHalfLife)
+            usageDirty.add(i)
 
-            radius = radiusSize(buttonSize)
-            icon = iconSize(buttonSize)
+        if not usageTimer.isActive():
+            usageTimer.start()
+        else:
+            pass
 
-            if windowShadow:
-                pass
-            else:
-                self.menuSize = valueRadius * 2 + buttonSize + 4
 
-                if self.menuSize < 90:
-                    self.menuSize = 90
-                else:
-                    pass
+    def flushUsage():
+        """Write the usage scores to the parameters, dropping faded ones."""
+        if not usageDirty:
+            return
 
-                self.menu.setMinimumWidth(self.menuSize)
-                self.menu.setMinimumHeight(self.menuSize)
+        paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+        paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
+        indexList = splitIndexList(paramIndexGet.GetString("IndexList"))
 
-            num = 1
+        # picks up a changed half life with the next flush
+        readUsageHalfLife()
 
-            for i in commands:
+        now = time.time()
+        data = {}
 
-                button = HoverButton()
-                button.setParent(self.menu)
-                button.setAttribute(QtCore.Qt.WA_Hover)
-                button.setStyleSheet(styleButton + radius)
-                button.setAttribute(QtCore.Qt.WA_TranslucentBackground)
-                button.setDefaultAction(commands[commands.index(i)])
-                button.setGeometry(0, 0, buttonSize, buttonSize)
-                button.setIconSize(QtCore.QSize(icon, icon))
-                button.setProperty("ButtonX", self.radius *
-                                   (math.cos(angle * num + angleStart)))
-                button.setProperty("ButtonY", self.radius *
-                                   (math.sin(angle * num + angleStart)))
+        for pie in usageStore:
+            if pie != "All" and int(pie) not in indexList:
+                continue
 
-                self.buttons.append(button)
+            data[pie] = {}
 
-                num = num + 1
+            for command in usageStore[pie]:
+                score = decayedScore(usageStore[pie][command], now)
+                if score >= 0.05:
+                    data[pie][command] = [round(score, 3), int(now)]
+                else:
+                    pass
 
-            buttonQuickMenu = quickMenu()
-            buttonQuickMenu.setParent(self.menu)
-            self.buttons.append(buttonQuickMenu)
+        usageStore.clear()
+        usageStore.update(data)
 
-            buttonClose = closeButton()
-            buttonClose.setParent(self.menu)
-            self.buttons.append(buttonClose)
+        paramGet.SetString("Usage", json.dumps(data, separators=(",", ":")))
+        stats.count("usage.flush")
 
-            if compositingManager:
-                pass
+        dirty = list(usageDirty)
+        usageDirty.clear()
+
+        # auto ordered pies pick up the new order on their next build
+        for pie in dirty:
+            if pie != "All" and int(pie) in indexList and \
+               paramIndexGet.GetGroup(pie).GetBool("AutoOrder") and \
+               usageOrderChanged(pie):
+                PieMenuInstance.invalidate(pie)
             else:
-                for i in self.buttons:
-                    i.setAttribute(QtCore.Qt.WA_PaintOnScreen)
+                pass
 
-        def hide(self):
-            for i in self.buttons:
-                i.hide()
+        updateMostUsedPie()
 
-            self.menu.hide()
 
-        def showAtMouse(self, notKeyTriggered=False):
-        
-            nonlocal selectionTriggered
-            nonlocal contextPhase
-            global lastPosX
-            global lastPosY
-            
-            paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+    def updateMostUsedPie():
+        """Fill the "Most used" pie with the highest scored commands."""
+        paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+        paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
+
+        if not paramGet.GetBool("MostUsedPie"):
+            return
 
-            enableContext = paramGet.GetBool("EnableContext")
+        count = max(paramGet.GetInt("MostUsedCount", 8), 1)
+        scores = usageStore.get("All", {})
 
-            if contextPhase:
-                sel = Gui.Selection.getSelectionEx()
-                if not sel:
-                    self.hide()
-                    contextPhase = False
-                    updateCommands()
-                elif not enableContext:
-                    self.hide()
-                    updateCommands()
-                else:
-                    updateCommands(context=True)
-            else:
-                updateCommands()
+        commands = []
 
-            if self.menu.isVisible():
-                self.hide()
+        for i in sorted(scores, key=lambda i: -scores[i][0]):
+            if i not in commandQuarantine and not i.startswith("PieMenu_Pie_") and \
+               not i.startswith("PieMenu_Dial_"):
+                commands.append(i)
             else:
-                if windowShadow:
-                    pos = mw.mapFromGlobal(QtGui.QCursor.pos())
-                    if notKeyTriggered:
-                        if contextPhase:
-                            # special case treatment
-                            if selectionTriggered:
-                                selectionTriggered = False
-                            else:
-                                pos.setX(lastPosX)
-                                pos.setY(lastPosY)
-                            lastPosX = pos.x()
-                            lastPosY = pos.y()
-                        else:
-                            pos.setX(lastPosX)
-                            pos.setY(lastPosY)
-                    else:
-                        lastPosX = pos.x()
-                        lastPosY = pos.y()
+                pass
 
-                    self.menu.popup(QtCore.QPoint(mw.pos()))
-                    self.menu.setGeometry(mw.geometry())
+        toolList = ".,.".join(commands[:count])
+        index = getCurrentMenuIndex("Most used")
 
-                    for i in self.buttons:
-                        i.move(i.property("ButtonX") + pos.x() - i.width() / 2,
-                               i.property("ButtonY") + pos.y() - i.height() / 2)
+        if index == "-1":
+            group = createPie("Most used")
+        else:
+            group = paramIndexGet.GetGroup(index)
 
-                        i.setVisible(True)
+        if group.GetString("ToolList") != toolList:
+            group.SetString("ToolList", toolList)
+        else:
+            pass
 
-                    for i in self.buttons:
-                        i.repaint()
-                else:
-                    pos = QtGui.QCursor.pos()
-                    if notKeyTriggered:
-                        if contextPhase:
-                            # special case treatment
-                            if selectionTriggered:
-                                selectionTriggered = False
-                            else:
-                                pos.setX(lastPosX)
-                                pos.setY(lastPosY)
-                            lastPosX = pos.x()
-                            lastPosY = pos.y()
-                        else:
-                            pos.setX(lastPosX)
-                            pos.setY(lastPosY)
-                    else:
-                        lastPosX = pos.x()
-                        lastPosY = pos.y()
-                        
-                    for i in self.buttons:
-                        i.move(i.property("ButtonX") + (self.menuSize - i.size().width()) / 2,
-                               i.property("ButtonY") + (self.menuSize - i.size().height()) / 2)
 
-                        i.setVisible(True)
+    def actionCommand(action):
+        """Return the tool list entry of an action, empty if it has none."""
+        return action.objectName() or action.property("Command") or ""
 
-                    self.menu.popup(QtCore.QPoint(pos.x() - self.menuSize / 2, pos.y() - self.menuSize / 2))
 
+    def orderByUsage(actions, pieIndex, layout):
+        """Put the most used commands on the fastest to reach slots.
 
-    sign = {
-        "<": operator.lt,
-        "<=": operator.le,
-        "==": operator.eq,
-        "!=": operator.ne,
-        ">": operator.gt,
-        ">=": operator.ge,
-        }
+        The first page and the inner ring come first, and on a ring the
+        four axis directions before the diagonals.
+        """
+        now = time.time()
+        scores = {}
 
+        for i in actions:
+            scores[i] = usageScore(actionCommand(i), pieIndex, now)
 
-    def contextList():
-        paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
-        indexList = paramIndexGet.GetString("IndexList")
+        return core.orderByScore(actions, scores, layout["Slots"])
 
-        contextAll.clear()
 
-        if indexList:
-            indexList = indexList.split(".,.")
+    def usageOrderChanged(pieIndex):
+        """Return True if a cached build of the pie has an outdated order."""
+        for key in PieMenuInstance.cache:
+            if key[0] != "Pie" or key[1] != pieIndex:
+                continue
 
-            temp = []
+            entry = PieMenuInstance.cache[key]
+            actions = []
 
-            for i in indexList:
-                temp.append(int(i))
+            for i in entry["Buttons"]:
+                if i.property("Ring") is not None:
+                    actions.append(i.defaultAction())
+                else:
+                    pass
 
-            indexList = temp
-        else:
-            indexList = []
+            toolList = list(key[2])
 
-        for i in indexList:
-            a = str(i)
-            group = paramIndexGet.GetGroup(a)
-            groupContext = group.GetGroup("Context")
+            def position(action):
+                command = actionCommand(action) or action.property("SubPie") or ""
+                if command in toolList:
+                    return toolList.index(command)
+                else:
+                    return len(toolList)
 
-            if groupContext.GetBool("Enabled"):
+            # the order is computed from the tool list order
+            ordered = orderByUsage(sorted(actions, key=position), pieIndex,
+                                   entry["Layout"])
 
-                current = {}
+            if ordered != actions:
+                return True
+            else:
+                pass
 
-                current["Index"] = a
+        return False
 
-                current["VertexSign"] = groupContext.GetString("VertexSign")
-                current["VertexValue"] = groupContext.GetInt("VertexValue")
 
-                current["EdgeSign"] = groupContext.GetString("EdgeSign")
-                current["EdgeValue"] = groupContext.GetInt("EdgeValue")
+    def autoOrder(actions, group, pieIndex):
+        """Order the actions by usage if the pie asks for it."""
+        if group is None or pieIndex is None or not group.GetBool("AutoOrder"):
+            return actions
 
-                current["FaceSign"] = groupContext.GetString("FaceSign")
-                current["FaceValue"] = groupContext.GetInt("FaceValue")
+        radius, buttonSize = PieMenuInstance.layoutParams(group)
 
-                current["ObjectSign"] = groupContext.GetString("ObjectSign")
-                current["ObjectValue"] = groupContext.GetInt("ObjectValue")
+        return orderByUsage(actions, pieIndex, pieLayout(len(actions), radius, buttonSize))
 
-                contextAll[i] = current
 
-            else:
-                pass
+    def triggerAction(action, pie=None):
+        """Trigger the action of a slice and count its use."""
+        nonlocal lastAction
 
+        if recorder.recording():
+            pos = QtGui.QCursor.pos()
+            recorder.record("slice", actionCommand(action) or action.property("SubPie") or "",
+                            pos.x(), pos.y())
+        else:
+            pass
 
-    def getContextPie(v, e, f, o):
-        global globalContextPie
-        global globalIndexPie
+        if action is repeatAction:
+            action.trigger()
+            return
 
-        globalContextPie = False
-        globalIndexPie = None
+        command = actionCommand(action)
 
-        for i in contextAll:
+        # a dial only works inside the pie, it is neither counted nor repeated
+        if command and not action.property("Dial"):
+            recordUsage(command, pie)
+        else:
+            pass
 
-            current = contextAll[i]
+        if action is not lastAction and action not in subPieActions.values() and \
+           not action.property("Dial"):
+            lastAction = action
+            # the centre slots follow through the changed signal
+            repeatAction.setIcon(action.icon())
+            repeatAction.setText("Repeat " + action.text().replace("&", ""))
+            repeatAction.setToolTip(repeatAction.text())
+            repeatAction.setEnabled(True)
+        else:
+            pass
 
-            def vertex():
-                if sign[current["VertexSign"]](v, current["VertexValue"]):
-                    edge()
+        action.trigger()
+
+
+    def repeatLastCommand():
+        """Trigger the last pie command again, no pie is built."""
+        if lastAction is not None and lastAction.isEnabled():
+            stats.count("repeat")
+            triggerAction(lastAction)
+        else:
+            pass
+
+
+    class HoverButton(QtGui.QToolButton):
+
+        def __init__(self, parent=None):
+            super(HoverButton, self).__init__()
+
+        def mouseReleaseEvent(self, event):
+            if self.defaultAction().isEnabled():
+                PieMenuInstance.runAction(self.defaultAction())
+            else:
+                pass
+
+
+    class ContainerFilter(QtCore.QObject):
+        """Route the input of the pie containers and slices to the pie menu."""
+
+        def eventFilter(self, obj, event):
+            if event.type() == QtCore.QEvent.KeyPress:
+                return PieMenuInstance.keyPress(event)
+            elif event.type() in (QtCore.QEvent.MouseMove, QtCore.QEvent.HoverMove):
+                PieMenuInstance.mouseMove()
+                return False
+            elif event.type() == QtCore.QEvent.MouseButtonRelease:
+                return PieMenuInstance.mouseRelease()
+            else:
+                return False
+
+
+    class PieMenu:
+
+        def __init__(self):
+
+            self.radius = 100
+            self.buttons = []
+            self.buttonSize = 32
+            self.menuSize = 0
+            # state machine: Idle, Gesture (waiting for a flick),
+            # Normal, Context, Dynamic (pie shown)
+            self.state = "Idle"
+            self.lastState = "Normal"
+            self.contextIndex = None
+            self.pos = None
+            # fully built pies, least recently used first
+            self.cache = collections.OrderedDict()
+            self.entry = None
+            # parent pies of the current sub-pie
+            self.stack = []
+            self.searchText = ""
+            self.searchResults = []
+            self.filter = ContainerFilter()
+            # slice selected in hover mode, triggered after the dwell time
+            self.candidate = None
+            self.dwellTimer = QtCore.QTimer()
+            self.dwellTimer.setSingleShot(True)
+            self.dwellTimer.timeout.connect(self.onDwell)
+            self.gesture = None
+            # transition of the running build, None outside of build()
+            self.transition = None
+            # document and recompute state of a running chain
+            self.chain = None
+            # property edited by a dial slice
+            self.dial = None
+            self.dialTimer = QtCore.QTimer()
+            self.dialTimer.setSingleShot(True)
+            self.dialTimer.timeout.connect(self.onDialPreview)
+            self.gestureClock = QtCore.QElapsedTimer()
+            self.gestureTimer = QtCore.QTimer()
+            self.gestureTimer.setInterval(10)
+            self.gestureTimer.timeout.connect(self.onGestureTimer)
+            self.readParams()
+            self.menu = self.container()
+
+        def readParams(self):
+            """Read the trigger settings once instead of on every event."""
+            paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+
+            self.triggerMode = paramGet.GetString("TriggerMode")
+            self.dwell = paramGet.GetInt("HoverDwell", 150)
+            self.deadZone = paramGet.GetInt("HoverDeadZone", 40)
+            self.gestureDelay = paramGet.GetInt("GestureDelay", 250)
+            self.repeatSlot = paramGet.GetBool("RepeatSlot")
+            self.chainMode = paramGet.GetBool("ChainMode")
+            self.dynamicMode = paramGet.GetBool("DynamicPie")
+            self.dynamicBudget = paramGet.GetInt("DynamicBudget", 30)
+            self.dialInterval = int(1000 / max(paramGet.GetInt("DialRate", 10), 1))
+
+        def container(self):
+            menu = QtGui.QMenu(mw)
+            menu.aboutToHide.connect(self.onAboutToHide)
+            menu.installEventFilter(self.filter)
+            menu.setStyleSheet(styleContainer)
+            menu.setWindowFlags(menu.windowFlags() | QtCore.Qt.FramelessWindowHint)
+            menu.setAttribute(QtCore.Qt.WA_TranslucentBackground)
+
+            if compositingManager:
+                pass
+            else:
+                menu.setAttribute(QtCore.Qt.WA_PaintOnScreen)
+
+            return menu
+
+        def layoutParams(self, group=None):
+            """Return the radius and button size configured in the group."""
+            paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+
+            if paramGet.GetBool("ToolBar") or group is None:
+                return 100, 32
+
+            valueRadius = group.GetInt("Radius")
+            valueButton = group.GetInt("Button")
+
+            if not valueRadius:
+                valueRadius = 100
+            if not valueButton:
+                valueButton = 32
+
+            return valueRadius, valueButton
+
+        def setCurrent(self, entry):
+            previous = self.entry
+
+            if previous is None:
+                self.menu.deleteLater()
+            elif previous is not entry:
+                if self.menu.isVisible():
+                    self.hide()
+                if not self.isHeld(previous):
+                    self.release(previous)
+
+            self.entry = entry
+            self.menu = entry["Menu"]
+            self.buttons = entry["Buttons"]
+            self.menuSize = entry["MenuSize"]
+            self.radius = entry["Radius"]
+            self.buttonSize = entry["ButtonSize"]
+
+        def isHeld(self, entry):
+            """Return True if the build is cached or a parent pie."""
+            if self.cache.get(entry["Key"]) is entry:
+                return True
+
+            for i in self.stack:
+                if i is entry:
+                    return True
+
+            return False
+
+        def activate(self, key):
+            """Make a cached pie current, return False if not cached."""
+            if key is None or key not in self.cache:
+                stats.count("cache.miss")
+                return False
+
+            self.cache.move_to_end(key)
+            self.setCurrent(self.cache[key])
+            stats.count("cache.hit")
+
+            if self.entry["Speculative"]:
+                self.entry["Speculative"] = False
+                stats.count("prebuild.hit")
+            else:
+                pass
+
+            return True
+
+        def release(self, entry):
+            if entry["Speculative"]:
+                stats.count("prebuild.wasted")
+            else:
+                pass
+
+            for i in entry["Buttons"]:
+                # the quick menu is parented to the main window
+                if i.menu():
+                    i.menu().deleteLater()
+            entry["Menu"].deleteLater()
+
+        def evict(self):
+            paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+            maxCount = max(paramGet.GetInt("PieCacheSize", 5), 1)
+            maxCost = paramGet.GetInt("PieCacheMemory", 8192) * 1024
+
+            pinned = self.pinned()
+            opened = []
+            guesses = []
+
+            cost = 0
+            for key in self.cache:
+                if key in pinned:
+                    pass
+                elif self.cache[key]["Speculative"]:
+                    guesses.append(key)
+                    cost = cost + self.cache[key]["Cost"]
+                else:
+                    opened.append(key)
+                    cost = cost + self.cache[key]["Cost"]
+
+            # guesses have their own slots and never push an opened pie out
+            while guesses and (len(guesses) > self.guessSlots() or cost > maxCost):
+                cost = cost - self.drop(guesses.pop(0))
+
+            while len(opened) > 1 and \
+                  (len(opened) > maxCount or cost > maxCost):
+                cost = cost - self.drop(opened.pop(0))
+
+        def drop(self, key):
+            """Evict the cached build, return its cost."""
+            entry = self.cache.pop(key)
+            stats.count("cache.evict")
+
+            if entry is not self.entry and not self.isHeld(entry):
+                self.release(entry)
+            else:
+                pass
+
+            return entry["Cost"]
+
+        def guessSlots(self):
+            paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+
+            return max(paramGet.GetInt("PrebuildSlots", 2), 0)
+
+        def canPrebuild(self):
+            """Return False if a new guess could only evict itself."""
+            paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+            maxCost = paramGet.GetInt("PieCacheMemory", 8192) * 1024
+
+            cost = 0
+            for key in self.cache:
+                cost = cost + self.cache[key]["Cost"]
+
+            return self.guessSlots() > 0 and cost < maxCost
+
+        def pinned(self):
+            """Return the keys of the latest builds of the shortcut pies."""
+            latest = {}
+
+            for key in self.cache:
+                if key[0] == "Pie" and key[1] in pieShortcuts:
+                    latest[key[1]] = key
                 else:
                     pass
 
-            def edge():
-                if sign[current["EdgeSign"]](e, current["EdgeValue"]):
-                    face()
+            return set(latest.values())
+
+        def invalidate(self, index):
+            """Drop all cached builds of the pie with the given index."""
+            for key in list(self.cache):
+                if key[1] == index:
+                    entry = self.cache.pop(key)
+                    stats.count("cache.invalidate")
+                    if entry is not self.entry and not self.isHeld(entry):
+                        self.release(entry)
+                    else:
+                        pass
                 else:
                     pass
 
-            def face():
-                if sign[current["FaceSign"]](f, current["FaceValue"]):
-                    obj()
+            # a shortcut pie has to be warm for the next press
+            if index in pieShortcuts:
+                prebuildPie(index)
+            else:
+                pass
+
+        def add_commands(self, commands, context=False, key=None, group=None,
+                         speculative=False):
+
+            if speculative:
+                stats.count("prebuild")
+            elif self.transition is not None:
+                stats.count("build")
+                stats.count("rebuild." + self.transition)
+            else:
+                stats.count("build")
+
+            menu = self.container()
+            buttons = []
+
+            if group is None:
+                if context:
+                    group = getGroup(mode=2)
+                else:
+                    group = getGroup(mode=1)
+
+            valueRadius, valueButton = self.layoutParams(group)
+
+            layout = pieLayout(len(commands), valueRadius, valueButton)
+            buttonSize = layout["ButtonSize"]
+
+            radius = radiusSize(buttonSize)
+            icon = iconSize(buttonSize)
+
+            menuSize = 0
+
+            if windowShadow:
+                pass
+            else:
+                menuSize = layout["Outer"] * 2 + buttonSize + 4
+
+                if menuSize < 90:
+                    menuSize = 90
                 else:
                     pass
 
-            def obj():
-                if sign[current["ObjectSign"]](o, current["ObjectValue"]):
-                    global globalContextPie
-                    global globalIndexPie
+                menu.setMinimumWidth(menuSize)
+                menu.setMinimumHeight(menuSize)
 
-                    globalContextPie = "True"
-                    globalIndexPie = current["Index"]
+            # accelerators restart on every page
+            pageSlices = {}
+
+            for i, slot in zip(commands, layout["Slots"]):
+
+                button = HoverButton()
+                button.setParent(menu)
+                button.setAttribute(QtCore.Qt.WA_Hover)
+                button.setStyleSheet(styleButton + radius)
+                button.setAttribute(QtCore.Qt.WA_TranslucentBackground)
+                button.setDefaultAction(i)
+                button.setGeometry(0, 0, buttonSize, buttonSize)
+                button.setIconSize(QtCore.QSize(icon, icon))
+                button.setProperty("ButtonX", slot[0])
+                button.setProperty("ButtonY", slot[1])
+                button.setProperty("Angle", slot[2])
+                button.setProperty("Ring", slot[3])
+                button.setProperty("Page", slot[4])
+                button.installEventFilter(self.filter)
+
+                number = pageSlices.get(slot[4], 0)
+                acceleratorBadge(button, number)
+                pageSlices[slot[4]] = number + 1
+
+                buttons.append(button)
+
+            if layout["Pages"] > 1:
+                buttonPage = pageButton(layout["Pages"])
+                buttonPage.setParent(menu)
+                buttons.append(buttonPage)
+            else:
+                buttonPage = None
+
+            buttonQuickMenu = quickMenu()
+            buttonQuickMenu.setParent(menu)
+            buttons.append(buttonQuickMenu)
+
+            buttonClose = closeButton()
+            buttonClose.setParent(menu)
+            buttons.append(buttonClose)
+
+            buttonRepeat = repeatButton()
+            buttonRepeat.setParent(menu)
+            buttons.append(buttonRepeat)
+
+            if compositingManager:
+                pass
+            else:
+                for i in buttons:
+                    i.setAttribute(QtCore.Qt.WA_PaintOnScreen)
+
+            # rough estimate of the backing store of all buttons
+            cost = 0
+            for i in buttons:
+                cost = cost + i.width() * i.height() * 4 + 4096
+
+            entry = {"Key": key,
+                     "Menu": menu,
+                     "Buttons": buttons,
+                     "Close": buttonClose,
+                     "MenuSize": menuSize,
+                     "Radius": valueRadius,
+                     "ButtonSize": valueButton,
+                     "Cost": cost,
+                     "Speculative": speculative,
+                     "Layout": layout,
+                     "Page": 0,
+                     "PageButton": buttonPage,
+                     "Search": None}
+
+            if buttonPage is not None:
+                buttonPage.clicked.connect(lambda: self.nextPage(entry))
+            else:
+                pass
+
+            if speculative:
+                # keep the current pie
+                self.cache[key] = entry
+            else:
+                self.setCurrent(entry)
+
+                if key is not None:
+                    self.cache[key] = entry
                 else:
                     pass
 
-            vertex()
+            self.evict()
 
-        if globalContextPie == "True":
-            return globalIndexPie
-        else:
-            return None
+        def hide(self):
+            self.commitDial()
+            self.search("")
+            self.setCandidate(None)
+            self.gestureTimer.stop()
+
+            if self.chain is not None:
+                QtCore.QTimer.singleShot(0, self.onChainIdle)
+            else:
+                pass
 
+            for i in self.buttons:
+                i.hide()
 
-    def listTopo():
-    
-        nonlocal selectionTriggered
-        nonlocal contextPhase
+            self.menu.hide()
+            self.state = "Idle"
 
-        sel = Gui.Selection.getSelectionEx()
-        paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
-        paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
+        def onAboutToHide(self):
+            # the container can also be closed by Qt, e.g. by a click outside
+            self.commitDial()
+            self.search("")
+            self.setCandidate(None)
 
-        vertexes = 0
-        edges = 0
-        faces = 0
-        objects = 0
+            if self.chain is not None:
+                QtCore.QTimer.singleShot(0, self.onChainIdle)
+            else:
+                pass
+            self.state = "Idle"
 
-        allList = []
+        def moveButton(self, button):
+            """Place a button relative to the centre of the pie."""
+            if windowShadow:
+                button.move(button.property("ButtonX") + self.pos.x() - button.width() / 2,
+                            button.property("ButtonY") + self.pos.y() - button.height() / 2)
+            else:
+                button.move(button.property("ButtonX") + (self.menuSize - button.width()) / 2,
+                            button.property("ButtonY") + (self.menuSize - button.height()) / 2)
 
-        for i in sel:
-            if not i.SubElementNames:
-                objects = objects + 1
+        def sliceButtons(self):
+            """Return the visible slices, search results while searching."""
+            if self.searchText:
+                buttons = self.entry["Search"]["Buttons"]
             else:
-                for a in i.SubElementNames:
-                    allList.append(a)
+                buttons = self.buttons
 
-        for i in allList:
-            if i.startswith('Vertex'):
-                vertexes = vertexes + 1
-            elif i.startswith('Edge'):
-                edges = edges + 1
-            elif i.startswith('Face'):
-                faces = faces + 1
+            slices = []
+
+            for i in buttons:
+                if i.property("Ring") is not None and i.isVisible():
+                    slices.append(i)
+                else:
+                    pass
+
+            return slices
+
+        def sliceAt(self, angle, distance):
+            """Return the enabled slice nearest to the direction and ring.
+
+            Beyond the outermost ring plus half a button there is no slice,
+            like within the dead zone.
+            """
+            best = None
+            bestScore = None
+            slices = self.sliceButtons()
+
+            outer = 0
+            for i in slices:
+                outer = max(outer, i.property("Ring") + i.width() / 2)
+
+            if distance > outer:
+                return None
+
+            for i in slices:
+                ring = i.property("Ring")
+
+                if not i.isEnabled():
+                    continue
+
+                difference = abs(angle - i.property("Angle")) % (2 * math.pi)
+                difference = min(difference, 2 * math.pi - difference)
+                score = (round(abs(distance - ring)), difference)
+
+                if bestScore is None or score < bestScore:
+                    best = i
+                    bestScore = score
+                else:
+                    pass
+
+            return best
+
+        def setCandidate(self, button, dwell=True):
+            if button is self.candidate:
+                return
+
+            if self.candidate is not None:
+                self.candidate.setDown(False)
             else:
                 pass
 
-        pieIndex = getContextPie(vertexes,
-                                 edges,
-                                 faces,
-                                 objects)
+            self.candidate = button
+
+            if button is not None and dwell:
+                button.setDown(True)
+                self.dwellTimer.start(self.dwell)
+            elif button is not None:
+                button.setDown(True)
+                self.dwellTimer.stop()
+            else:
+                self.dwellTimer.stop()
+
+        def triggerSlice(self, button):
+            if button.isEnabled():
+                self.runAction(button.defaultAction())
+            else:
+                pass
+
+        def pieId(self, key=None):
+            """Return the pie index of a build key, None for other pies."""
+            if key is None and self.entry is not None:
+                key = self.entry["Key"]
+            else:
+                pass
+
+            if key is not None and key[0] == "Pie":
+                return key[1]
+            else:
+                return None
+
+        def runAction(self, action):
+            """Run the action of a slice, the pie stays open in chain mode."""
+            pie = self.pieId()
+
+            if action.property("Dial"):
+                # the pie turns into the dial
+                triggerAction(action, pie)
+            elif self.chainMode and self.state != "Idle" and \
+               action not in subPieActions.values():
+                self.startChain()
+                self.setCandidate(None)
+                triggerAction(action, pie)
+                stats.count("chain.step")
+                # the command may have changed the state of the other slices
+                if self.state != "Idle":
+                    self.refreshState()
+                else:
+                    pass
+            else:
+                self.hide()
+                triggerAction(action, pie)
+
+        def startChain(self):
+            """Freeze recomputes and open one transaction for the chain."""
+            if self.chain is not None:
+                return
+
+            doc = App.ActiveDocument
+            self.chain = {"Document": None, "Frozen": False}
+
+            if doc is None:
+                return
 
-        if pieIndex:
             try:
-                pieName = paramIndexGet.GetString(pieIndex).decode("UTF-8")
+                self.chain["Frozen"] = doc.RecomputesFrozen
+                doc.RecomputesFrozen = True
+                self.chain["Document"] = doc.Name
+                App.setActiveTransaction("Pie menu chain", True)
             except AttributeError:
-                pieName = paramIndexGet.GetString(pieIndex)
-            try:
-                paramGet.SetString("ContextPie", pieName.encode("UTF-8"))
-            except TypeError:
-                paramGet.SetString("ContextPie", pieName)
-            contextPhase = True
+                pass
 
-            updateCommands(context=True)
-            PieMenuInstance.hide()
-            selectionTriggered = True
-            PieMenuInstance.showAtMouse(notKeyTriggered=True)
-        else:
-            pass
+        def onChainIdle(self):
+            # a sub-pie hides and shows again, the chain goes on
+            if self.state == "Idle" and self.chain is not None:
+                self.endChain()
+            else:
+                pass
 
+        def endChain(self):
+            """Close the chain transaction and recompute once."""
+            chain = self.chain
+            self.chain = None
 
-    class SelObserver:
+            try:
+                App.closeActiveTransaction()
+            except AttributeError:
+                pass
 
-        def addSelection(self, doc, obj, sub, pnt):
+            name = chain["Document"]
 
-            listTopo()
+            if name is not None and name in App.listDocuments():
+                doc = App.getDocument(name)
+                doc.RecomputesFrozen = chain["Frozen"]
+                doc.recompute()
+                stats.count("chain.recompute")
+            else:
+                pass
 
-        def removeSelection(self, doc, obj, sub):
+        def clockAngle(self, button):
+            # clockwise from the top slot
+            return (button.property("Angle") - 3 * math.pi / 2) % (2 * math.pi)
 
-            listTopo()
+        def navigate(self, key):
+            """Move the keyboard selection around the ring or between rings."""
+            buttons = self.sliceButtons()
 
+            if not buttons:
+                return
 
-    def addObserver():
+            current = None
+
+            for i in buttons:
+                if i is self.candidate:
+                    current = i
+                else:
+                    pass
+
+            if current is None:
+                inner = min(i.property("Ring") for i in buttons)
+                ring = [i for i in buttons if i.property("Ring") == inner]
+                self.setCandidate(min(ring, key=self.clockAngle), dwell=False)
+            elif key in (QtCore.Qt.Key_Left, QtCore.Qt.Key_Right):
+                ring = [i for i in buttons if i.property("Ring") == current.property("Ring")]
+                ring.sort(key=self.clockAngle)
+
+                if key == QtCore.Qt.Key_Right:
+                    step = 1
+                else:
+                    step = -1
+
+                self.setCandidate(ring[(ring.index(current) + step) % len(ring)],
+                                  dwell=False)
+            else:
+                rings = sorted(set(i.property("Ring") for i in buttons))
+                index = rings.index(current.property("Ring"))
+
+                if key == QtCore.Qt.Key_Up:
+                    index = index + 1
+                else:
+                    index = index - 1
+
+                if 0 <= index < len(rings):
+                    button = self.sliceAt(current.property("Angle"), rings[index])
+                    if button is not None:
+                        self.setCandidate(button, dwell=False)
+                    else:
+                        pass
+                else:
+                    pass
+
+        def mouseMove(self):
+            """Hover mode: select the slice by angle and distance to the centre."""
+            if self.dial is not None:
+                self.dialMove()
+                return
+
+            if self.triggerMode != "Hover" or self.state == "Idle" or self.pos is None:
+                return
+
+            pos = self.cursorPos()
+            dx = pos.x() - self.pos.x()
+            dy = pos.y() - self.pos.y()
+            distance = math.hypot(dx, dy)
+
+            if distance < self.deadZone:
+                self.setCandidate(None)
+            else:
+                self.setCandidate(self.sliceAt(math.atan2(dy, dx) % (2 * math.pi),
+                                               distance))
+
+        def mouseRelease(self):
+            """A click commits a running dial, return True if consumed."""
+            if self.dial is not None:
+                self.hide()
+                return True
+            else:
+                return False
+
+        def startDial(self, prop):
+            """Turn the pie into a dial editing the property of the selection."""
+            if self.state == "Idle" or self.dial is not None:
+                return
+
+            objects = []
+
+            for i in Gui.Selection.getSelection():
+                if prop in i.PropertiesList:
+                    objects.append(i)
+                else:
+                    pass
+
+            if not objects:
+                return
+
+            value = getattr(objects[0], prop)
+
+            if hasattr(value, "Value"):
+                value = value.Value
+            else:
+                pass
+
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return
+
+            doc = objects[0].Document
+            doc.openTransaction("Pie menu dial " + prop)
+
+            self.dial = {"Property": prop,
+                         "Objects": objects,
+                         "Document": doc,
+                         "Integer": isinstance(value, int),
+                         "Start": value,
+                         "Value": value,
+                         "Applied": value,
+                         "Angle": None,
+                         "Turns": 0.0}
+
+            stats.count("dial")
+
+            self.setCandidate(None)
+
+            for i in self.buttons:
+                i.hide()
+
+            field = self.searchWidgets(self.entry)["Field"]
+            self.moveButton(field)
+            field.show()
+            field.raise_()
+            self.dialText()
+
+        def dialText(self):
+            dial = self.dial
+            field = self.searchWidgets(self.entry)["Field"]
+
+            if dial["Integer"]:
+                field.setText("{}: {}".format(dial["Property"], dial["Value"]))
+            else:
+                field.setText("{}: {:.2f}".format(dial["Property"], dial["Value"]))
+
+        def dialMove(self):
+            """Turning around the centre changes the value."""
+            dial = self.dial
+            pos = self.cursorPos()
+            angle = math.atan2(pos.y() - self.pos.y(), pos.x() - self.pos.x())
+
+            if math.hypot(pos.x() - self.pos.x(), pos.y() - self.pos.y()) < self.deadZone:
+                return
+            elif dial["Angle"] is None:
+                dial["Angle"] = angle
+                return
+
+            delta = angle - dial["Angle"]
+            delta = (delta + math.pi) % (2 * math.pi) - math.pi
+            dial["Angle"] = angle
+            dial["Turns"] = dial["Turns"] + delta / (2 * math.pi)
+
+            # one turn counts twelve for integers, the start value for floats
+            if dial["Integer"]:
+                value = dial["Start"] + int(round(dial["Turns"] * 12))
+            else:
+                value = dial["Start"] + dial["Turns"] * max(abs(dial["Start"]), 1.0)
+
+            if dial["Start"] >= 0:
+                value = max(value, 0)
+            else:
+                pass
+
+            if value == dial["Value"]:
+                return
+
+            dial["Value"] = value
+            self.dialText()
+
+            # superseded values are dropped, at most one preview per interval
+            if not self.dialTimer.isActive():
+                self.dialTimer.start(self.dialInterval)
+            else:
+                pass
+
+        def applyDial(self):
+            dial = self.dial
+
+            if dial["Value"] == dial["Applied"]:
+                return
+
+            try:
+                for i in dial["Objects"]:
+                    setattr(i, dial["Property"], dial["Value"])
+                dial["Document"].recompute()
+                dial["Applied"] = dial["Value"]
+            except Exception:
+                App.Console.PrintError(traceback.format_exc())
+
+        def onDialPreview(self):
+            if self.dial is not None:
+                self.applyDial()
+                stats.count("dial.preview")
+            else:
+                pass
+
+        def commitDial(self):
+            """Apply the final value and commit the dial transaction."""
+            if self.dial is None:
+                return
+
+            self.dialTimer.stop()
+            self.applyDial()
+
+            self.dial["Document"].commitTransaction()
+            self.dial = None
+
+            self.searchWidgets(self.entry)["Field"].hide()
+
+        def cancelDial(self):
+            """Undo all previews of the dial."""
+            if self.dial is None:
+                return
+
+            self.dialTimer.stop()
+
+            doc = self.dial["Document"]
+            doc.abortTransaction()
+            doc.recompute()
+            self.dial = None
+
+            stats.count("dial.cancel")
+
+            self.hide()
+
+        def onDwell(self):
+            button = self.candidate
+
+            if button is None or self.state == "Idle":
+                return
+            elif button.isVisible() and button.isEnabled():
+                self.triggerSlice(button)
+            else:
+                self.setCandidate(None)
+
+        def keyPress(self, event):
+            """Handle accelerators, arrow keys and type to search.
+
+            Return True if the key was consumed.
+            """
+            key = event.key()
+            text = event.text()
+            modifiers = event.modifiers() & (QtCore.Qt.ControlModifier |
+                                             QtCore.Qt.AltModifier |
+                                             QtCore.Qt.MetaModifier)
+
+            if self.state == "Idle":
+                return False
+            elif self.dial is not None:
+                if key == QtCore.Qt.Key_Escape:
+                    self.cancelDial()
+                elif key in (QtCore.Qt.Key_Return, QtCore.Qt.Key_Enter):
+                    self.hide()
+                else:
+                    pass
+                return True
+            elif key == QtCore.Qt.Key_Backspace:
+                if self.searchText:
+                    self.search(self.searchText[:-1])
+                    return True
+                return False
+            elif key == QtCore.Qt.Key_Escape:
+                if self.searchText:
+                    self.search("")
+                    return True
+                return False
+            elif key in (QtCore.Qt.Key_Left, QtCore.Qt.Key_Right,
+                         QtCore.Qt.Key_Up, QtCore.Qt.Key_Down):
+                self.navigate(key)
+                return True
+            elif key in (QtCore.Qt.Key_Return, QtCore.Qt.Key_Enter):
+                if self.candidate is not None and self.candidate.isVisible():
+                    self.triggerSlice(self.candidate)
+                    return True
+                elif self.searchText and self.searchResults:
+                    action = self.searchResults[0]
+                    if action.isEnabled():
+                        self.runAction(action)
+                    else:
+                        pass
+                    return True
+                return False
+            elif len(text) == 1 and text in acceleratorKeys and not modifiers and \
+                 not self.searchText and self.acceleratorSlice(text) is not None:
+                self.triggerSlice(self.acceleratorSlice(text))
+                return True
+            elif text and text.isprintable() and not modifiers:
+                if self.searchText or not text.isspace():
+                    self.search(self.searchText + text)
+                    return True
+                return False
+            else:
+                return False
+
+        def acceleratorSlice(self, text):
+            """Return the visible slice with the accelerator, or None."""
+            for i in self.sliceButtons():
+                if i.property("Accelerator") == text and i.isVisible():
+                    return i
+                else:
+                    pass
+
+            return None
+
+        def searchWidgets(self, entry):
+            """Return the search field and result slices of a build."""
+            if entry["Search"] is None:
+                field = QtGui.QLineEdit()
+                field.setParent(entry["Menu"])
+                field.setReadOnly(True)
+                field.setFocusPolicy(QtCore.Qt.NoFocus)
+                field.setAlignment(QtCore.Qt.AlignCenter)
+                field.setStyleSheet(styleSearch)
+                field.setGeometry(0, 0, max(entry["Radius"], 80), 24)
+                field.setProperty("ButtonX", 0)
+                field.setProperty("ButtonY", 0)
+
+                entry["Search"] = {"Field": field, "Buttons": []}
+            else:
+                pass
+
+            return entry["Search"]
+
+        def search(self, text):
+            """Show the commands matching the typed text as temporary slices."""
+            if not text and not self.searchText:
+                return
+
+            self.searchText = text
+            entry = self.entry
+            search = self.searchWidgets(entry)
+
+            if not text:
+                self.searchResults = []
+                search["Field"].hide()
+
+                for i in search["Buttons"]:
+                    i.hide()
+
+                if self.state != "Idle":
+                    for i in self.buttons:
+                        i.setVisible(self.isOnPage(i))
+                else:
+                    pass
+
+                return
+
+            stats.count("search")
+
+            actions = []
+
+            for i in searchIndex.search(text, 12):
+                action = searchIndex.action(i)
+                if action is not None:
+                    actions.append(action)
+                else:
+                    pass
+
+            self.searchResults = actions
+
+            layout = pieLayout(len(actions), self.radius, self.buttonSize)
+            buttonSize = layout["ButtonSize"]
+            icon = iconSize(buttonSize)
+
+            while len(search["Buttons"]) < len(actions):
+                button = HoverButton()
+                button.setParent(entry["Menu"])
+                button.setAttribute(QtCore.Qt.WA_Hover)
+                button.setAttribute(QtCore.Qt.WA_TranslucentBackground)
+                button.installEventFilter(self.filter)
+                search["Buttons"].append(button)
+
+            for i in self.buttons:
+                i.hide()
+
+            for i in search["Buttons"][len(actions):]:
+                i.hide()
+
+            for number, (button, action, slot) in enumerate(zip(search["Buttons"],
+                                                                actions,
+                                                                layout["Slots"])):
+                previous = button.defaultAction()
+
+                if previous is not action:
+                    if previous is not None:
+                        button.removeAction(previous)
+                    else:
+                        pass
+                    button.setDefaultAction(action)
+                else:
+                    pass
+
+                button.setStyleSheet(styleButton + radiusSize(buttonSize))
+                button.setGeometry(0, 0, buttonSize, buttonSize)
+                button.setIconSize(QtCore.QSize(icon, icon))
+                button.setProperty("ButtonX", slot[0])
+                button.setProperty("ButtonY", slot[1])
+                button.setProperty("Angle", slot[2])
+                button.setProperty("Ring", slot[3])
+                acceleratorBadge(button, number)
+                self.moveButton(button)
+                button.show()
+
+            search["Field"].setText(text)
+            self.moveButton(search["Field"])
+            search["Field"].show()
+            search["Field"].raise_()
+
+        def cursorPos(self):
+            if windowShadow:
+                return mw.mapFromGlobal(QtGui.QCursor.pos())
+            else:
+                return QtGui.QCursor.pos()
+
+        def isOnPage(self, button):
+            # the repeat slot is shown on every page if enabled
+            if button.property("Repeat"):
+                return self.repeatSlot
+
+            page = button.property("Page")
+
+            return page is None or page == self.entry["Page"]
+
+        def refreshState(self):
+            """Evaluate isActive for the commands on the visible page.
+
+            Buttons follow their action through the changed signal, so only
+            the actions whose state differs schedule a paint.
+            """
+            try:
+                getCommand = Gui.Command.get
+            except AttributeError:
+                return
+
+            actions = []
+
+            for i in self.buttons:
+                action = i.defaultAction()
+                if action is not None and action.objectName() and self.isOnPage(i):
+                    actions.append(action)
+                else:
+                    pass
+
+            for action in actions:
+                try:
+                    command = getCommand(action.objectName())
+                except Exception:
+                    command = None
+
+                if command is None:
+                    continue
+
+                try:
+                    action.setEnabled(bool(command.isActive()))
+                except Exception:
+                    pass
+
+            stats.count("refresh.state", len(actions))
+
+        def nextPage(self, entry):
+            """Show the next page of a paginated pie, no rebuild needed."""
+            entry["Page"] = (entry["Page"] + 1) % entry["Layout"]["Pages"]
+
+            for i in entry["Buttons"]:
+                page = i.property("Page")
+                if page is not None:
+                    i.setVisible(page == entry["Page"])
+                else:
+                    pass
+
+            entry["PageButton"].setText(str(entry["Page"] + 1) + "/" +
+                                        str(entry["Layout"]["Pages"]))
+
+            if entry is self.entry:
+                self.refreshState()
+            else:
+                pass
+
+        def resetStack(self):
+            stack = self.stack
+            self.stack = []
+
+            for i in stack:
+                if i is not self.entry and not self.isHeld(i):
+                    self.release(i)
+                else:
+                    pass
+
+        def build(self, state, transition, pieIndex=None):
+            """Build the pie for the target state, once per event."""
+            self.resetStack()
+            # a cache hit constructs nothing, add_commands counts the rebuild
+            self.transition = transition
+
+            try:
+                if state == "Dynamic":
+                    updateDynamic()
+                else:
+                    updateCommands(context=(state == "Context"), pieIndex=pieIndex)
+            finally:
+                self.transition = None
+
+        def show(self, state, pos):
+            """Show the current pie at the given position."""
+            self.lastState = state
+            self.pos = pos
+
+            if self.stack:
+                self.entry["Close"].setIcon(QtGui.QIcon(iconBack))
+            else:
+                self.entry["Close"].setIcon(QtGui.QIcon(iconClose))
+
+            self.refreshState()
+
+            if windowShadow:
+                self.menu.popup(QtCore.QPoint(mw.pos()))
+                self.menu.setGeometry(mw.geometry())
+
+                for i in self.buttons:
+                    self.moveButton(i)
+                    i.setVisible(self.isOnPage(i))
+            else:
+                for i in self.buttons:
+                    self.moveButton(i)
+                    i.setVisible(self.isOnPage(i))
+
+                self.menu.popup(QtCore.QPoint(pos.x() - self.menuSize / 2, pos.y() - self.menuSize / 2))
+
+            self.state = state
+
+        def showAtMouse(self, notKeyTriggered=False):
+            """Key transition: toggle the pie at the cursor."""
+
+            if notKeyTriggered:
+                self.refresh()
+                return
+
+            pos = QtGui.QCursor.pos()
+            recorder.record("key", pos.x(), pos.y(), None)
+
+            transition = core.keyTransition(self.state, self.triggerMode)
+
+            if transition == "Hide":
+                self.hide()
+                return
+
+            stats.count("transition.key")
+
+            paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+
+            stats.count("show")
+
+            selected = bool(Gui.Selection.getSelectionEx())
+
+            if not selected:
+                self.contextIndex = None
+            else:
+                pass
+
+            state, pieIndex = core.keyTarget(self.contextIndex,
+                                             selected,
+                                             paramGet.GetBool("EnableContext"),
+                                             editModePie(),
+                                             self.dynamicMode)
+
+            if transition == "Gesture":
+                self.startGesture(state, pieIndex)
+                return
+
+            self.build(state, "key", pieIndex)
+            self.show(state, self.cursorPos())
+
+        def showPie(self, index):
+            """Key transition of a pie shortcut: toggle the pie at the cursor."""
+            pos = QtGui.QCursor.pos()
+            recorder.record("key", pos.x(), pos.y(), index)
+
+            transition = core.keyTransition(self.state, self.triggerMode)
+
+            if transition == "Hide":
+                self.hide()
+                return
+
+            stats.count("transition.key")
+
+            stats.count("show")
+
+            if transition == "Gesture":
+                self.startGesture("Normal", index)
+                return
+
+            self.build("Normal", "key", index)
+            self.show("Normal", self.cursorPos())
+
+        def startGesture(self, state, pieIndex):
+            """Gesture mode: wait for a flick before building the pie."""
+            self.state = "Gesture"
+            self.gesture = {"State": state,
+                            "PieIndex": pieIndex,
+                            "Pos": self.cursorPos()}
+            self.gestureClock.start()
+            self.gestureTimer.start()
+
+        def onGestureTimer(self):
+            gesture = self.gesture
+
+            if self.state != "Gesture":
+                self.gestureTimer.stop()
+                return
+
+            pos = self.cursorPos()
+            dx = pos.x() - gesture["Pos"].x()
+            dy = pos.y() - gesture["Pos"].y()
+
+            if math.hypot(dx, dy) >= self.deadZone:
+                self.gestureTimer.stop()
+                self.state = "Idle"
+                self.flick(gesture, math.atan2(dy, dx) % (2 * math.pi))
+            elif self.gestureClock.elapsed() >= self.gestureDelay:
+                # the pointer stayed still, show the pie as a guide
+                self.gestureTimer.stop()
+                self.state = "Idle"
+                stats.count("gesture.show")
+                self.build(gesture["State"], "key", gesture["PieIndex"])
+                self.show(gesture["State"], gesture["Pos"])
+            else:
+                pass
+
+        def flick(self, gesture, angle):
+            """Trigger the inner slice in the flick direction without a build."""
+            if gesture["State"] == "Dynamic":
+                key, group, actions = dynamicContent()
+                toolList = None
+            else:
+                key, group, toolList, actions = pieContent(gesture["State"] == "Context",
+                                                           gesture["PieIndex"])
+
+            if key in self.cache:
+                layout = self.cache[key]["Layout"]
+                actions = []
+                for i in self.cache[key]["Buttons"]:
+                    if i.property("Ring") is not None:
+                        actions.append(i.defaultAction())
+                    else:
+                        pass
+            else:
+                if toolList is not None:
+                    actions, complete = pieActions(toolList)
+                    actions = autoOrder(actions, group, key[1])
+                else:
+                    pass
+                radius, buttonSize = self.layoutParams(group)
+                layout = pieLayout(len(actions), radius, buttonSize)
+
+            best = None
+            bestDifference = None
+
+            for action, slot in zip(actions, layout["Slots"]):
+                if slot[4] != 0 or slot[3] != layout["Slots"][0][3]:
+                    continue
+
+                difference = abs(angle - slot[2]) % (2 * math.pi)
+                difference = min(difference, 2 * math.pi - difference)
+
+                if bestDifference is None or difference < bestDifference:
+                    best = action
+                    bestDifference = difference
+                else:
+                    pass
+
+            if best is None or not best.isEnabled():
+                stats.count("gesture.miss")
+                return
+
+            stats.count("gesture.flick")
+
+            self.pos = gesture["Pos"]
+            self.lastState = gesture["State"]
+
+            if best in subPieActions.values():
+                # a sub-pie returns to its parent, which has to be current
+                self.build(gesture["State"], "key", gesture["PieIndex"])
+            else:
+                pass
+
+            triggerAction(best, self.pieId(key))
+
+        def showContext(self, index):
+            """Selection transition: show the matching context pie."""
+            stats.count("transition.selection")
+
+            self.contextIndex = index
+            self.build("Context", "selection")
+            self.show("Context", self.cursorPos())
+
+        def showSubPie(self, index):
+            """Enter the child pie, it is built on first entry only."""
+            stats.count("transition.subPie")
+
+            if self.pos is None:
+                self.pos = self.cursorPos()
+
+            self.stack.append(self.entry)
+            updateCommands(context=(self.lastState == "Context"),
+                           pieIndex=index)
+            self.show(self.lastState, self.pos)
+
+        def back(self):
+            """Return to the parent pie, or hide the top level pie."""
+            if self.stack:
+                stats.count("transition.back")
+                self.setCurrent(self.stack.pop())
+                self.show(self.lastState, self.pos)
+            else:
+                self.hide()
+
+        def refresh(self, state=None, rebuild=True):
+            """Settings transition: show the pie again where it was."""
+            stats.count("transition.settings")
+
+            self.hide()
+            self.readParams()
+
+            if state is None:
+                state = self.lastState
+
+            if self.pos is None:
+                self.pos = self.cursorPos()
+
+            if rebuild:
+                self.build(state, "settings")
+            else:
+                pass
+
+            self.show(state, self.pos)
+
+
+    sign = {
+        "<": operator.lt,
+        "<=": operator.le,
+        "==": operator.eq,
+        "!=": operator.ne,
+        ">": operator.gt,
+        ">=": operator.ge,
+        }
+
+
+    def contextList():
+        paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
+        indexList = paramIndexGet.GetString("IndexList")
+
+        contextAll.clear()
+
+        if indexList:
+            indexList = indexList.split(".,.")
+
+            temp = []
+
+            for i in indexList:
+                temp.append(int(i))
+
+            indexList = temp
+        else:
+            indexList = []
+
+        for i in indexList:
+            a = str(i)
+            group = paramIndexGet.GetGroup(a)
+            groupContext = group.GetGroup("Context")
+
+            if groupContext.GetBool("Enabled"):
+
+                current = {}
+
+                current["Index"] = a
+
+                current["VertexSign"] = groupContext.GetString("VertexSign")
+                current["VertexValue"] = groupContext.GetInt("VertexValue")
+
+                current["EdgeSign"] = groupContext.GetString("EdgeSign")
+                current["EdgeValue"] = groupContext.GetInt("EdgeValue")
+
+                current["FaceSign"] = groupContext.GetString("FaceSign")
+                current["FaceValue"] = groupContext.GetInt("FaceValue")
+
+                current["ObjectSign"] = groupContext.GetString("ObjectSign")
+                current["ObjectValue"] = groupContext.GetInt("ObjectValue")
+
+                current["Bounds"] = ruleBounds(current)
+
+                contextAll[i] = current
+
+            else:
+                pass
+
+
+    def ruleBounds(current):
+        """Compile a context rule to (lower, upper, excluded) per topology."""
+        bounds = []
+
+        for i in ["Vertex", "Edge", "Face", "Object"]:
+            op = current[i + "Sign"]
+            value = current[i + "Value"]
+
+            lower = 0
+            upper = None
+            excluded = None
+
+            if op == "<":
+                upper = value - 1
+            elif op == "<=":
+                upper = value
+            elif op == "==":
+                lower = value
+                upper = value
+            elif op == "!=":
+                excluded = value
+            elif op == ">":
+                lower = value + 1
+            elif op == ">=":
+                lower = value
+            else:
+                pass
+
+            bounds.append((lower, upper, excluded))
+
+        return bounds
+
+
+    def ruleDistance(bounds, counts):
+        """Return the selection steps needed to match a rule, None if never."""
+        distance = 0
+
+        for (lower, upper, excluded), count in zip(bounds, counts):
+            if upper is not None and upper < lower:
+                return None
+            elif count < lower:
+                distance = distance + lower - count
+            elif upper is not None and count > upper:
+                distance = distance + count - upper
+            elif count == excluded:
+                distance = distance + 1
+            else:
+                pass
+
+        return distance
+
+
+    prebuildQueue = []
+
+
+    def prebuildPie(index):
+        if index not in prebuildQueue:
+            prebuildQueue.append(index)
+            prebuildTimer.start()
+        else:
+            pass
+
+
+    def predictContextPies(counts, pieIndex):
+        """Queue prebuilds of context pies one selection step away."""
+        # pies with a shortcut stay queued
+        prebuildQueue[:] = [i for i in prebuildQueue if i in pieShortcuts]
+
+        for i in contextAll:
+            current = contextAll[i]
+            if current["Index"] != pieIndex and \
+               ruleDistance(current["Bounds"], counts) == 1:
+                prebuildQueue.append(current["Index"])
+            else:
+                pass
+
+        if prebuildQueue:
+            prebuildTimer.start()
+        else:
+            pass
+
+
+    # actions of the pies with their own shortcut keyed by pie index
+    pieShortcuts = {}
+
+
+    def updatePieShortcuts():
+        """Register an action for every pie with its own shortcut."""
+        paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
+
+        shortcuts = {}
+
+        for i in splitIndexList(paramIndexGet.GetString("IndexList")):
+            a = str(i)
+            shortcut = paramIndexGet.GetGroup(a).GetString("Shortcut")
+            if shortcut:
+                shortcuts[a] = shortcut
+            else:
+                pass
+
+        for a in list(pieShortcuts):
+            if a not in shortcuts:
+                action = pieShortcuts.pop(a)
+                mw.removeAction(action)
+                action.deleteLater()
+            else:
+                pass
+
+        for a in shortcuts:
+            if a in pieShortcuts:
+                action = pieShortcuts[a]
+            else:
+                action = QtGui.QAction(mw)
+                action.setObjectName("PieMenuShortCut_" + a)
+                action.triggered.connect(lambda checked=False, index=a:
+                                         PieMenuInstance.showPie(index))
+                mw.addAction(action)
+                pieShortcuts[a] = action
+
+            try:
+                pie = paramIndexGet.GetString(a).decode("UTF-8")
+            except AttributeError:
+                pie = paramIndexGet.GetString(a)
+
+            action.setText("Invoke pie menu " + pie)
+            action.setShortcut(QtGui.QKeySequence(shortcuts[a]))
+
+            # opening the pie should cost only a show
+            prebuildPie(a)
+
+
+    def onPrebuildTimer():
+        paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
+
+        # one prebuild per idle slice
+        if prebuildQueue:
+            index = prebuildQueue.pop(0)
+            # the pie may have been removed meanwhile
+            if int(index) not in splitIndexList(paramIndexGet.GetString("IndexList")):
+                pass
+            elif index not in pieShortcuts and not PieMenuInstance.canPrebuild():
+                # the guess would only evict itself
+                stats.count("prebuild.skipped")
+            else:
+                updateCommands(context=True, pieIndex=index, prebuild=True)
+        else:
+            pass
+
+        if prebuildQueue:
+            prebuildTimer.start()
+        else:
+            pass
+
+
+    def getContextPie(v, e, f, o):
+        global globalContextPie
+        global globalIndexPie
+
+        globalContextPie = False
+        globalIndexPie = None
+
+        for i in contextAll:
+
+            current = contextAll[i]
+
+            def vertex():
+                if sign[current["VertexSign"]](v, current["VertexValue"]):
+                    edge()
+                else:
+                    pass
+
+            def edge():
+                if sign[current["EdgeSign"]](e, current["EdgeValue"]):
+                    face()
+                else:
+                    pass
+
+            def face():
+                if sign[current["FaceSign"]](f, current["FaceValue"]):
+                    obj()
+                else:
+                    pass
+
+            def obj():
+                if sign[current["ObjectSign"]](o, current["ObjectValue"]):
+                    global globalContextPie
+                    global globalIndexPie
+
+                    globalContextPie = "True"
+                    globalIndexPie = current["Index"]
+                else:
+                    pass
+
+            vertex()
+
+        if globalContextPie == "True":
+            return globalIndexPie
+        else:
+            return None
+
+
+    def listTopo():
+
+        sel = Gui.Selection.getSelectionEx()
+        paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+        paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
+
+        vertexes = 0
+        edges = 0
+        faces = 0
+        objects = 0
+
+        allList = []
+
+        for i in sel:
+            if not i.SubElementNames:
+                objects = objects + 1
+            else:
+                for a in i.SubElementNames:
+                    allList.append(a)
+
+        for i in allList:
+            if i.startswith('Vertex'):
+                vertexes = vertexes + 1
+            elif i.startswith('Edge'):
+                edges = edges + 1
+            elif i.startswith('Face'):
+                faces = faces + 1
+            else:
+                pass
+
+        pieIndex = getContextPie(vertexes,
+                                 edges,
+                                 faces,
+                                 objects)
+
+        if pieIndex:
+            try:
+                pieName = paramIndexGet.GetString(pieIndex).decode("UTF-8")
+            except AttributeError:
+                pieName = paramIndexGet.GetString(pieIndex)
+            try:
+                paramGet.SetString("ContextPie", pieName.encode("UTF-8"))
+            except TypeError:
+                paramGet.SetString("ContextPie", pieName)
+
+            PieMenuInstance.showContext(pieIndex)
+        else:
+            pass
+
+        if paramGet.GetBool("EnableContext"):
+            predictContextPies((vertexes, edges, faces, objects), pieIndex)
+        else:
+            pass
+
+
+    class SelObserver:
+
+        def addSelection(self, doc, obj, sub, pnt):
+
+            listTopo()
+
+        def removeSelection(self, doc, obj, sub):
+
+            listTopo()
+
+
+    def addObserver():
+        paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+
+        if paramGet.GetBool("EnableContext"):
+            Gui.Selection.addObserver(selObserver)
+        else:
+            Gui.Selection.removeObserver(selObserver)
+
+
+    def getGuiActionMapAll():
+
+        actions = {}
+        duplicates = []
+
+        for i in mw.findChildren(QtGui.QAction):
+            if i.objectName() is not None:
+                if i.objectName() != "" and i.icon():
+                    if i.objectName() in actions:
+                        if i.objectName() not in duplicates:
+                            duplicates.append(i.objectName())
+                        else:
+                            pass
+                    else:
+                        actions[i.objectName()] = i
+                else:
+                    pass
+            else:
+                pass
+
+        for d in duplicates:
+            del actions[d]
+
+        return actions
+
+
+    def extractWorkbench(command):
+
+        cmd_parts = command.split("_")
+        if cmd_parts[0] == "":
+            workbench = "None"
+        else:
+            workbench = cmd_parts[0]
+
+        return workbench
+
+
+    def getActionData(action, actions, commands, workbenches):
+
+        if not action.icon():
+            return
+        if actions is not None:
+            if action in actions:
+                pass
+            else:
+                actions.append(action)
+        if commands is None and workbenches is None:
+            return
+
+        command = action.objectName()
+        if len(command) == 0:
+            workbench = "None"
+        else:
+            if commands is not None:
+                if command in commands:
+                    pass
+                else:
+                    commands.append(command)
+            workbench = extractWorkbench(command)
+
+        if workbenches is not None:
+            if not workbench in workbenches:
+                workbenches.append(workbench)
+
+
+    class ToolBarIndex(QtCore.QObject):
+        """Index of toolbar name to its actions in toolbar order."""
+
+        def __init__(self):
+            super(ToolBarIndex, self).__init__()
+
+            self.index = {}
+            self.toolBars = {}
+            self.dirty = set()
+            self.stale = True
+            self.titles = None
+            self.generation = 0
+
+        def onWorkbenchActivated(self):
+            # new toolbars may have been created, rebuild on next lookup
+            self.stale = True
+
+        def rebuild(self):
+            self.index = {}
+            self.toolBars = {}
+            self.dirty = set()
+
+            for i in mw.findChildren(QtGui.QToolBar):
+                name = i.objectName()
+                # a workbench may recreate a toolbar under the same name,
+                # installing the filter again on the same widget is a no-op
+                i.installEventFilter(self)
+                self.toolBars[name] = i
+                self.update(name)
+
+            self.stale = False
+            self.titles = None
+            stats.count("toolBarIndex.rebuild")
+
+        def update(self, name):
+            actions = []
+
+            try:
+                for i in self.toolBars[name].actions():
+                    if i.objectName() and not i.isSeparator():
+                        actions.append(i)
+                    else:
+                        pass
+            except RuntimeError:
+                # toolbar has been deleted
+                del self.toolBars[name]
+
+            self.index[name] = actions
+            self.titles = None
+
+        def eventFilter(self, obj, event):
+            if event.type() == QtCore.QEvent.ActionAdded or \
+               event.type() == QtCore.QEvent.ActionRemoved:
+                self.dirty.add(obj.objectName())
+            else:
+                pass
+
+            return False
+
+        def refresh(self):
+            if self.stale:
+                self.rebuild()
+            else:
+                for i in self.dirty:
+                    if i in self.toolBars:
+                        self.update(i)
+                self.dirty = set()
+
+        def actions(self, idToolBar):
+            """Return the actions of the toolbar in toolbar order."""
+            self.refresh()
+
+            return self.index.get(idToolBar, [])
+
+        def catalogue(self):
+            """Return the titles of all toolbars with commands.
+
+            The catalogue is cached until a workbench is activated or a
+            toolbar changes, its generation identifies the cached state.
+            """
+            self.refresh()
+
+            if self.titles is None:
+                self.titles = []
+
+                for i in self.toolBars:
+                    if self.index.get(i):
+                        try:
+                            title = self.toolBars[i].windowTitle()
+                        except RuntimeError:
+                            continue
+                        if title not in self.titles:
+                            self.titles.append(title)
+                    else:
+                        pass
+
+                self.generation = self.generation + 1
+                stats.count("toolBarIndex.catalogue")
+
+            return self.titles
+
+
+    class SearchIndex(core.SearchIndex):
+        """Search index over the live and cached commands."""
+
+        def __init__(self):
+            core.SearchIndex.__init__(self)
+            self.actions = {}
+            self.stale = True
+            self.cached = False
+
+        def onWorkbenchActivated(self):
+            # index the new actions once the activation has finished
+            self.stale = True
+            searchTimer.start()
+
+        def add(self, command, menuText, toolTip, action=None):
+            if action is not None:
+                self.actions[command] = action
+            else:
+                pass
+
+            core.SearchIndex.add(self, command, menuText, toolTip)
+
+        def update(self):
+            """Index the commands not seen since the last update."""
+            if not self.stale:
+                return
+
+            if not self.cached:
+                loadCommandCache()
+                for i in commandCache:
+                    self.add(i, commandCache[i]["MenuText"], commandCache[i]["ToolTip"])
+                self.cached = True
+            else:
+                pass
+
+            actions = getGuiActionMapAll()
+
+            for i in actions:
+                if i not in self.actions and not i.startswith("PieMenu"):
+                    self.add(i, actions[i].text(), actions[i].toolTip(), actions[i])
+                else:
+                    pass
+
+            self.stale = False
+
+        def search(self, text, limit):
+            """Return the best matches, most used first."""
+            self.update()
+
+            now = time.time()
+
+            return core.SearchIndex.search(self, text, limit,
+                                           score=lambda i: usageScore(i, now=now),
+                                           exclude=commandQuarantine)
+
+        def action(self, command):
+            if command in self.actions:
+                return self.actions[command]
+            elif command in commandCache:
+                return cachedAction(command)
+            else:
+                return None
+
+
+    def getGuiToolButtonData(idToolBar, actions, commands, workbenches):
+
+        for action in toolBarIndex.actions(idToolBar):
+            getActionData(action, actions, commands, workbenches)
+
+
+    def commandWorkbench(command):
+        """Return the name of the workbench providing the command."""
+
+        cmd_parts = command.split("_")
+        # rule out special case: unknown Std action
+        if cmd_parts[0] == "Std":
+            return None
+        # match special cases
+        # Fem workbench
+        if cmd_parts[0] == "FEM":
+            cmd_parts[0] = "Fem"
+        # Sheet Metal workbench
+        if cmd_parts[0][:2] == "SM":
+            cmd_parts[0] = cmd_parts[0][:2]
+
+        return cmd_parts[0] + "Workbench"
+
+
+    commandAttempts = {}
+    commandQuarantine = set()
+    # workbench of a quarantined command as recorded in the command cache
+    quarantineWorkbenches = {}
+    commandAttemptLimit = 2
+
+
+    def quarantineCommand(command):
+        """Stop resolving a command for the rest of the session."""
+        commandQuarantine.add(command)
+        if command in commandCache:
+            quarantineWorkbenches[command] = commandCache[command].get("Workbench")
+        else:
+            pass
+        commandCache.pop(command, None)
+        commandProxies.pop(command, None)
+        stats.count("quarantine")
+
+
+    def releaseQuarantine():
+        """Retry the quarantined commands, the workbench may provide them."""
+        if not commandQuarantine:
+            return
+
+        released = set(commandQuarantine)
+        commandQuarantine.clear()
+        quarantineWorkbenches.clear()
+
+        for key in list(PieMenuInstance.cache):
+            if key[0] == "Pie" and released.intersection(key[2]):
+                PieMenuInstance.invalidate(key[1])
+            else:
+                pass
+
+
+    def releaseCommand(command):
+        """Release one quarantined entry that has become valid again."""
+        if command not in commandQuarantine:
+            return
+
+        commandQuarantine.discard(command)
+        quarantineWorkbenches.pop(command, None)
+        commandAttempts.pop(command, None)
+
+        for key in list(PieMenuInstance.cache):
+            if key[0] == "Pie" and command in key[2]:
+                PieMenuInstance.invalidate(key[1])
+            else:
+                pass
+
+
+    def loadWorkbenches(workbenches):
+        """Activate the workbenches once and return to the active one."""
+        nonlocal loadingWorkbenches
+
+        lastWorkbench = Gui.activeWorkbench()
+        loadingWorkbenches = True
+
+        try:
+            for i in workbenches:
+                Gui.activateWorkbench(i)
+
+            Gui.activateWorkbench(lastWorkbench.__class__.__name__)
+        finally:
+            loadingWorkbenches = False
+
+        stats.count("workbenchActivation", len(workbenches))
+
+
+    workbenchPies = {}
+
+
+    def workbenchPie(workbench, editMode=False):
+        """Return the index of the pie mapped to the workbench, or None."""
+        nonlocal workbenchPiesDirty
+
+        if workbenchPiesDirty:
+            paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
+            indexList = paramIndexGet.GetString("IndexList")
+            indexList = splitIndexList(indexList)
+
+            workbenchPies.clear()
+
+            for i in indexList:
+                group = paramIndexGet.GetGroup(str(i))
+                name = group.GetString("Workbench")
+                if name:
+                    workbenchPies[(name, group.GetBool("EditMode"))] = str(i)
+                else:
+                    pass
+
+            workbenchPiesDirty = False
+
+        return workbenchPies.get((workbench, editMode))
+
+
+    def onWorkbenchActivated(workbench):
+        """Select the pie mapped to the workbench and prebuild it."""
         paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+        paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
 
-        if paramGet.GetBool("EnableContext"):
-            Gui.Selection.addObserver(selObserver)
+        if loadingWorkbenches:
+            # workbench only loaded to resolve commands
+            return
+
+        releaseQuarantine()
+
+        index = workbenchPie(workbench)
+
+        if index is None:
+            return
+
+        try:
+            pieName = paramIndexGet.GetString(index).decode("UTF-8")
+        except AttributeError:
+            pieName = paramIndexGet.GetString(index)
+
+        paramGet.SetBool("ToolBar", False)
+        paramGet.RemString("ToolBar")
+        try:
+            paramGet.SetString("CurrentPie", pieName.encode("UTF-8"))
+        except TypeError:
+            paramGet.SetString("CurrentPie", pieName)
+
+        QtCore.QTimer.singleShot(0, lambda: updateCommands(prebuild=True))
+
+
+    def editModePie():
+        """Return the index of the pie mapped to the current edit mode."""
+        try:
+            if not Gui.ActiveDocument or not Gui.ActiveDocument.getInEdit():
+                return None
+        except AttributeError:
+            return None
+
+        return workbenchPie(Gui.activeWorkbench().__class__.__name__, True)
+
+
+    # isActive results of the dynamic pie keyed by pool and selection signature
+    dynamicCache = collections.OrderedDict()
+    # pool of the dynamic pie for the last selection, workbench and setting
+    dynamicPools = {}
+
+
+    def selectionSignature():
+        """Return the object types and element type counts of the selection."""
+        types = {}
+        elements = {}
+
+        for i in Gui.Selection.getSelectionEx():
+            try:
+                typeId = i.Object.TypeId
+            except AttributeError:
+                typeId = ""
+            types[typeId] = types.get(typeId, 0) + 1
+
+            for a in i.SubElementNames:
+                element = a.split(".")[-1].rstrip("0123456789")
+                elements[element] = elements.get(element, 0) + 1
+
+        return tuple(sorted(types.items())), tuple(sorted(elements.items()))
+
+
+    def dynamicPool(signature):
+        """Return the pool name and its actions keyed by command name.
+
+        The pool is the pie named in the DynamicPool parameter, or the
+        visible toolbars of the current workbench. It is only collected
+        again when the selection, workbench or setting has changed.
+        """
+        paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+
+        try:
+            pie = paramGet.GetString("DynamicPool").decode("UTF-8")
+        except AttributeError:
+            pie = paramGet.GetString("DynamicPool")
+
+        key = (pie, Gui.activeWorkbench().__class__.__name__, signature)
+
+        if dynamicPools.get("Key") != key:
+            dynamicPools["Key"] = key
+            dynamicPools["Pool"] = collectDynamicPool(pie)
+            stats.count("dynamic.pool")
+        else:
+            pass
+
+        return dynamicPools["Pool"]
+
+
+    def collectDynamicPool(pie):
+        pool = collections.OrderedDict()
+
+        if pie:
+            index = getCurrentMenuIndex(pie)
+            if index != "-1":
+                toolList = App.ParamGet("User parameter:BaseApp/PieMenu/Index")\
+                    .GetGroup(index).GetString("ToolList")
+                toolList = [i for i in toolList.split(".,.") if i]
+                actionMap = resolveActionMap(toolList, load=False)
+                for i in toolList:
+                    if i in actionMap and not i.startswith("PieMenu_"):
+                        pool[i] = actionMap[i]
+                    else:
+                        pass
+                return "Pie: " + pie, pool
+            else:
+                pass
+
+        toolBarIndex.refresh()
+
+        for name in list(toolBarIndex.toolBars):
+            try:
+                visible = toolBarIndex.toolBars[name].isVisible()
+            except RuntimeError:
+                continue
+
+            if visible:
+                for i in toolBarIndex.actions(name):
+                    if i.objectName() not in pool:
+                        pool[i.objectName()] = i
+                    else:
+                        pass
+            else:
+                pass
+
+        return Gui.activeWorkbench().__class__.__name__, pool
+
+
+    def evaluateDynamic(result, budget):
+        """Evaluate isActive of the pending commands within budget ms."""
+        try:
+            getCommand = Gui.Command.get
+        except AttributeError:
+            # no command API, every command of the pool is shown
+            result["Active"].extend(result["Pool"][result["Next"]:])
+            result["Next"] = len(result["Pool"])
+            return
+
+        clock = QtCore.QElapsedTimer()
+        clock.start()
+
+        while result["Next"] < len(result["Pool"]) and clock.elapsed() < budget:
+            command = result["Pool"][result["Next"]]
+            result["Next"] = result["Next"] + 1
+
+            try:
+                cmd = getCommand(command)
+                active = cmd is not None and cmd.isActive()
+            except Exception:
+                active = False
+
+            if active:
+                result["Active"].append(command)
+            else:
+                pass
+
+        stats.count("dynamic.evaluate")
+
+
+    def dynamicResult(create=True):
+        """Return the cached evaluation for the current pool and selection."""
+        signature = selectionSignature()
+        name, pool = dynamicPool(signature)
+        key = (name, signature)
+
+        if key in dynamicCache:
+            dynamicCache.move_to_end(key)
+            stats.count("dynamic.hit")
+        elif create:
+            dynamicCache[key] = {"Name": name,
+                                 "Pool": list(pool),
+                                 "Next": 0,
+                                 "Active": []}
+            while len(dynamicCache) > 16:
+                dynamicCache.popitem(last=False)
+        else:
+            return None, pool
+
+        return dynamicCache[key], pool
+
+
+    def dynamicContent():
+        """Return the cache key, group and actions of the dynamic pie.
+
+        Commands left over when the time budget is spent are evaluated
+        while the event loop is idle and shown on the next Tab press.
+        """
+        result, pool = dynamicResult()
+
+        if result["Next"] < len(result["Pool"]):
+            evaluateDynamic(result, PieMenuInstance.dynamicBudget)
+        else:
+            pass
+
+        if result["Next"] < len(result["Pool"]):
+            dynamicTimer.start()
+        else:
+            pass
+
+        actions = []
+
+        for i in result["Active"]:
+            if i in pool:
+                actions.append(pool[i])
+            else:
+                pass
+
+        group = getGroup(mode=1)
+        key = ("Dynamic", result["Name"], tuple(result["Active"])) + \
+            PieMenuInstance.layoutParams(group)
+
+        return key, group, actions
+
+
+    def onDynamicTimer():
+        # only while the selection still matches the evaluation
+        result, pool = dynamicResult(create=False)
+
+        if result is not None and result["Next"] < len(result["Pool"]):
+            # short slices between the ticks keep the pie responsive
+            evaluateDynamic(result, min(PieMenuInstance.dynamicBudget, 5))
+            if result["Next"] < len(result["Pool"]):
+                dynamicTimer.start()
+            else:
+                pass
+        else:
+            pass
+
+
+    def updateDynamic():
+        """Build the dynamic pie, the same commands reuse the cached build."""
+        key, group, actions = dynamicContent()
+
+        if PieMenuInstance.activate(key):
+            return
+
+        PieMenuInstance.add_commands(actions, key=key, group=group)
+
+
+    def actualizeWorkbenchActions(actions, toolList, actionMap):
+        """Resolve the tool list to actions in one pass.
+
+        Every workbench providing a missing command is activated once and
+        the action map is refreshed once afterwards. Commands that are
+        still not in the live action map after a bounded number of
+        attempts are quarantined. Returns the action map.
+        """
+        workbenches = []
+        missing = []
+        installed = Gui.listWorkbenches()
+
+        for i in toolList:
+            # rule out special case: there has to be an entry
+            if i == "" or i in actionMap:
+                pass
+            else:
+                missing.append(i)
+                # the workbench name is a guess, it may load nothing
+                cmdWb = commandWorkbench(i)
+                if commandAttempts.get(i, 0) >= commandAttemptLimit:
+                    pass
+                elif cmdWb is None or cmdWb not in installed:
+                    pass
+                elif cmdWb not in workbenches:
+                    workbenches.append(cmdWb)
+                else:
+                    pass
+
+        if workbenches:
+            loadWorkbenches(workbenches)
+            # after workbench activation actionMap has to be actualized
+            actionMap = getGuiActionMapAll()
+        else:
+            pass
+
+        for i in missing:
+            if i not in actionMap:
+                commandAttempts[i] = commandAttempts.get(i, 0) + 1
+                if commandAttempts[i] >= commandAttemptLimit:
+                    quarantineCommand(i)
+            else:
+                commandQuarantine.discard(i)
+
+        for i in toolList:
+            if i in actionMap and actionMap[i] not in actions:
+                actions.append(actionMap[i])
+
+        return actionMap
+
+
+    commandCache = {}
+    commandCacheSeen = set()
+    commandProxies = {}
+    commandCacheIconSizes = [16, 32, 64]
+
+
+    def commandCachePath():
+        """Return the path of the on-disk command metadata cache."""
+        try:
+            cacheDir = App.getUserCachePath()
+        except AttributeError:
+            cacheDir = App.getUserAppDataDir()
+
+        return os.path.join(cacheDir, "PieMenu", "CommandCache.json")
+
+
+    def loadCommandCache():
+        """Load the command metadata cache once per session."""
+        nonlocal commandCacheLoaded
+
+        if commandCacheLoaded:
+            return
+
+        commandCacheLoaded = True
+
+        try:
+            with open(commandCachePath()) as f:
+                data = json.load(f)
+            commandCache.update(data.get("Commands", {}))
+        except (IOError, OSError, ValueError, AttributeError):
+            pass
+
+
+    def saveCommandCache():
+        """Write the command metadata cache to disk."""
+        path = commandCachePath()
+
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, "w") as f:
+                json.dump({"Version": 1, "Commands": commandCache}, f)
+        except (IOError, OSError):
+            pass
+
+
+    def cacheAction(action):
+        """Refresh the cached metadata of a live action."""
+        command = action.objectName()
+
+        if command in commandCacheSeen:
+            return
+
+        commandCacheSeen.add(command)
+
+        icons = {}
+
+        for size in commandCacheIconSizes:
+            buffer = QtCore.QBuffer()
+            buffer.open(QtCore.QIODevice.WriteOnly)
+            action.icon().pixmap(size, size).save(buffer, "PNG")
+            icons[str(size)] = base64.b64encode(bytes(buffer.data())).decode("ascii")
+
+        commandCache[command] = {"Workbench": commandWorkbench(command),
+                                 "MenuText": action.text(),
+                                 "ToolTip": action.toolTip(),
+                                 "Icons": icons}
+
+        commandCacheTimer.start()
+
+
+    def cachedAction(command):
+        """Return a stand-in action rendered from the command cache.
+
+        The owning workbench is only loaded when the action is triggered.
+        """
+        if command in commandProxies:
+            return commandProxies[command]
+
+        entry = commandCache[command]
+
+        icon = QtGui.QIcon()
+
+        for size in entry["Icons"]:
+            pixmap = QtGui.QPixmap()
+            pixmap.loadFromData(base64.b64decode(entry["Icons"][size]), "PNG")
+            icon.addPixmap(pixmap)
+
+        action = QtGui.QAction(mw)
+        action.setProperty("Command", command)
+        action.setText(entry["MenuText"])
+        action.setToolTip(entry["ToolTip"])
+        action.setIcon(icon)
+
+        def onTriggered():
+            actionMap = actualizeWorkbenchActions([], [command], getGuiActionMapAll())
+
+            if command in actionMap:
+                actionMap[command].trigger()
+            else:
+                pass
+
+        action.triggered.connect(onTriggered)
+        commandProxies[command] = action
+
+        return action
+
+
+    def resolveActionMap(toolList, load=True):
+        """Return the actions of the tool list keyed by command name.
+
+        Live actions are preferred, cached commands are served by stand-in
+        actions and only the remaining commands load their workbench,
+        unless load is False.
+        """
+        loadCommandCache()
+
+        actionMap = getGuiActionMapAll()
+        missing = []
+
+        for i in toolList:
+            if i.startswith("PieMenu_") or i in actionMap:
+                pass
+            elif i and i not in commandCache and i not in commandQuarantine:
+                missing.append(i)
+            else:
+                pass
+
+        if missing and load:
+            actionMap = actualizeWorkbenchActions([], missing, actionMap)
+        else:
+            pass
+
+        resolved = {}
+
+        for i in toolList:
+            if i.startswith("PieMenu_"):
+                action = specialAction(i)
+                if action is not None:
+                    # the sub-pie or macro file may be back
+                    commandQuarantine.discard(i)
+                    resolved[i] = action
+                else:
+                    quarantineCommand(i)
+            elif i in actionMap:
+                # a live action always wins over the quarantine
+                cacheAction(actionMap[i])
+                resolved[i] = actionMap[i]
+            elif i in commandQuarantine:
+                pass
+            elif i in commandCache:
+                resolved[i] = cachedAction(i)
+            else:
+                pass
+
+        return resolved
+
+
+    subPieActions = {}
+
+
+    def subPieAction(index):
+        """Return the action entering the pie with the given index."""
+        paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
+
+        indexList = splitIndexList(paramIndexGet.GetString("IndexList"))
+
+        try:
+            if int(index) not in indexList:
+                return None
+        except ValueError:
+            return None
+
+        try:
+            pieName = paramIndexGet.GetString(index).decode("UTF-8")
+        except AttributeError:
+            pieName = paramIndexGet.GetString(index)
+
+        if index in subPieActions:
+            action = subPieActions[index]
+        else:
+            action = QtGui.QAction(mw)
+            action.setIcon(QtGui.QIcon(iconSubPie))
+            action.triggered.connect(lambda: PieMenuInstance.showSubPie(index))
+            # not a command, usage is not recorded for it
+            action.setProperty("SubPie", "PieMenu_Pie_" + index)
+            subPieActions[index] = action
+
+        action.setText(pieName)
+
+        return action
+
+
+    macroActions = {}
+    # compiled macros keyed by path, with the mtime they were compiled at
+    macroCode = {}
+
+
+    def macroPath():
+        paramMacro = App.ParamGet("User parameter:BaseApp/Preferences/Macro")
+        path = paramMacro.GetString("MacroPath")
+
+        if not path:
+            try:
+                path = App.getUserMacroDir(True)
+            except AttributeError:
+                path = os.path.join(App.getUserAppDataDir(), "Macro")
+
+        return path
+
+
+    def macroFile(name):
+        if os.path.isabs(name):
+            return name
+        else:
+            return os.path.join(macroPath(), name)
+
+
+    def macroList():
+        """Return the macro files in the macro directory."""
+        try:
+            files = os.listdir(macroPath())
+        except OSError:
+            files = []
+
+        return sorted(i for i in files if i.lower().endswith(".fcmacro"))
+
+
+    def onMacroChanged(path):
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+
+        if path in macroCode and macroCode[path][0] != mtime:
+            del macroCode[path]
+            stats.count("macro.invalidate")
+        else:
+            pass
+
+        if mtime is not None:
+            releaseCommand("PieMenu_Macro_" + os.path.relpath(path, macroPath()))
+        else:
+            pass
+
+        # editors that replace the file remove it from the watcher
+        if mtime is not None and path not in macroWatcher.files():
+            macroWatcher.addPath(path)
         else:
-            Gui.Selection.removeObserver(selObserver)
+            pass
 
 
-    def getGuiActionMapAll():
+    def runMacro(path):
+        """Run a macro file, it is only read and compiled when it changed."""
+        try:
+            mtime = os.path.getmtime(path)
+        except (IOError, OSError):
+            App.Console.PrintError(traceback.format_exc())
+            return
 
-        actions = {}
-        duplicates = []
+        # the watcher misses changes on some filesystems, the mtime does not
+        if path in macroCode and macroCode[path][0] == mtime:
+            code = macroCode[path][1]
+            stats.count("macro.hit")
+        else:
+            try:
+                with open(path, "rb") as f:
+                    code = compile(f.read(), path, "exec")
+            except (IOError, OSError, SyntaxError, ValueError):
+                App.Console.PrintError(traceback.format_exc())
+                return
 
-        for i in mw.findChildren(QtGui.QAction):
-            if i.objectName() is not None:
-                if i.objectName() != "" and i.icon():
-                    if i.objectName() in actions:
-                        if i.objectName() not in duplicates:
-                            duplicates.append(i.objectName())
-                        else:
-                            pass
-                    else:
-                        actions[i.objectName()] = i
-                else:
-                    pass
+            macroCode[path] = (mtime, code)
+            stats.count("macro.compile")
+
+            if path not in macroWatcher.files():
+                macroWatcher.addPath(path)
             else:
                 pass
 
-        for d in duplicates:
-            del actions[d]
+        # like the Macro menu, with the names of the Python console
+        namespace = dict(__main__.__dict__)
+        namespace["__name__"] = "__main__"
+        namespace["__file__"] = path
 
-        return actions
+        try:
+            exec(code, namespace)
+        except Exception:
+            App.Console.PrintError(traceback.format_exc())
 
 
-    def extractWorkbench(command):
+    def macroAction(name):
+        """Return the action running the macro file with the given name."""
+        path = macroFile(name)
 
-        cmd_parts = command.split("_")
-        if cmd_parts[0] == "":
-            workbench = "None"
-        else:
-            workbench = cmd_parts[0]
+        if name in macroActions:
+            return macroActions[name]
+        elif not os.path.isfile(path):
+            return None
 
-        return workbench
+        action = QtGui.QAction(mw)
+        action.setProperty("Command", "PieMenu_Macro_" + name)
+        action.setText(os.path.splitext(os.path.basename(name))[0])
+        action.setToolTip(path)
+        action.setIcon(QtGui.QIcon(":/icons/applications-python.svg"))
+        action.triggered.connect(lambda: runMacro(path))
+        macroActions[name] = action
 
+        return action
 
-    def getActionData(action, actions, commands, workbenches):
 
-        if not action.icon():
-            return
-        if actions is not None:
-            if action in actions:
-                pass
-            else:
-                actions.append(action)
-        if commands is None and workbenches is None:
-            return
+    dialActions = {}
 
-        command = action.objectName()
-        if len(command) == 0:
-            workbench = "None"
-        else:
-            if commands is not None:
-                if command in commands:
-                    pass
-                else:
-                    commands.append(command)
-            workbench = extractWorkbench(command)
 
-        if workbenches is not None:
-            if not workbench in workbenches:
-                workbenches.append(workbench)
+    def dialProperties():
+        """Return the property names offered as dial slices."""
+        paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+        properties = paramGet.GetString("DialProperties",
+                                        "Length,Length2,Radius,Height,Width,"
+                                        "Angle,Offset,Size,NumberX,NumberY,NumberPolar")
 
+        return [i.strip() for i in properties.split(",") if i.strip()]
 
-    def getGuiToolButtonData(idToolBar, actions, commands, workbenches):
 
-        actionMapAll = getGuiActionMapAll()
-        for i in actionMapAll:
-            action = actionMapAll[i]
-            for widgets in action.associatedWidgets():
-                if widgets.objectName() == idToolBar:
-                    getActionData(action, actions, commands, workbenches)
+    def dialAction(prop):
+        """Return the action turning the pie into a dial for the property."""
+        if prop in dialActions:
+            return dialActions[prop]
 
+        action = QtGui.QAction(mw)
+        action.setProperty("Command", "PieMenu_Dial_" + prop)
+        action.setProperty("Dial", True)
+        action.setText(prop)
+        action.setToolTip("Dial: " + prop)
+        action.setIcon(QtGui.QIcon(iconDial))
+        action.triggered.connect(lambda: PieMenuInstance.startDial(prop))
+        dialActions[prop] = action
 
-    def actualizeWorkbenchActions(actions, toolList, actionMap):
-        for i in toolList:
-            # rule out special case: there has to be an entry
-            if i == "":
-                pass
-            elif i in actionMap:
-                if not actionMap[i] in actions:
-                    actions.append(actionMap[i])
-            else:
-                cmd_parts = i.split("_")
-                # rule out special case: unknown Std action
-                if cmd_parts[0] == "Std":
-                    pass
-                else:
-                    # match special cases
-                    # Fem workbench
-                    if cmd_parts[0] == "FEM":
-                        cmd_parts[0] = "Fem"
-                    # Sheet Metal workbench
-                    if cmd_parts[0][:2] == "SM":
-                        cmd_parts[0] = cmd_parts[0][:2]
-
-                    cmdWb = cmd_parts[0] + "Workbench"
-                    # after workbench activation actionMap has to be actualized
-                    Gui.activateWorkbench(cmdWb)
-                    return True
-                
-        return False
+        return action
+
+
+    def specialAction(command):
+        """Return the action of a tool list entry that is not a command.
 
+        Sub-pies are stored as PieMenu_Pie_<index>, macros as
+        PieMenu_Macro_<file name> and dials as PieMenu_Dial_<property>.
+        """
+        if command.startswith("PieMenu_Pie_"):
+            return subPieAction(command[len("PieMenu_Pie_"):])
+        elif command.startswith("PieMenu_Macro_"):
+            return macroAction(command[len("PieMenu_Macro_"):])
+        elif command.startswith("PieMenu_Dial_"):
+            return dialAction(command[len("PieMenu_Dial_"):])
 
-    def updateCommands(context=False):
+        return None
 
+
+    def pieContent(context=False, pieIndex=None, load=True):
+        """Return the cache key, group, tool list and actions of a pie.
+
+        Toolbars have no tool list, pies have no actions until resolved.
+        """
         paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
         paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
         indexList = paramIndexGet.GetString("IndexList")
 
-        if paramGet.GetBool("ToolBar") and context is False:
+        group = None
+
+        if paramGet.GetBool("ToolBar") and context is False and pieIndex is None:
 
             paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
             toolbar = paramGet.GetString("ToolBar")
@@ -1017,7 +3600,12 @@ def pieMenuStart():
                 toolbar = toolbar_desc[1]
                 workbenches = toolbar_desc[0]
                 workbenches = workbenches.split(", ")
-                lastWorkbench = Gui.activeWorkbench()
+            else:
+                workbenches = []
+
+            if workbenches and not toolBarIndex.actions(toolbar) and load:
+                # toolbar not created yet, load its workbenches
+                toolbarWorkbenches = []
 
                 for i in workbenches:
                     # rule out special cases
@@ -1032,72 +3620,117 @@ def pieMenuStart():
                         if i[:2] == "SM":
                             i = i[:2]
 
-                        Gui.activateWorkbench(i + "Workbench")
+                        toolbarWorkbenches.append(i + "Workbench")
 
-                Gui.activateWorkbench(lastWorkbench.__class__.__name__)
+                loadWorkbenches(toolbarWorkbenches)
             else:
                 pass
 
             actions = []
             getGuiToolButtonData(toolbar, actions, None, None)
 
-        else:
+            commands = []
+            for i in actions:
+                commands.append(i.objectName())
 
-            if indexList:
-                indexList = indexList.split(".,.")
+            key = ("ToolBar", toolbar, tuple(commands)) + \
+                PieMenuInstance.layoutParams()
 
-                temp = []
+            return key, group, None, actions
 
-                for i in indexList:
-                    temp.append(int(i))
+        else:
 
-                indexList = temp
-            else:
-                indexList = []
+            toolList = None
 
-            if context:
-                try:
-                    text = paramGet.GetString("ContextPie").decode("UTF-8")
-                except AttributeError:
-                    text = paramGet.GetString("ContextPie")
+            if pieIndex is not None:
+                group = paramIndexGet.GetGroup(pieIndex)
+                toolList = group.GetString("ToolList")
             else:
-                try:
-                    text = paramGet.GetString("CurrentPie").decode("UTF-8")
-                except AttributeError:
-                    text = paramGet.GetString("CurrentPie")
-
-            toolList = None
+                indexList = splitIndexList(indexList)
 
-            for i in indexList:
-                a = str(i)
-                try:
-                    pie = paramIndexGet.GetString(a).decode("UTF-8")
-                except AttributeError:
-                    pie = paramIndexGet.GetString(a)
-                if pie == text:
-                    group = paramIndexGet.GetGroup(a)
-                    toolList = group.GetString("ToolList")
+                if context:
+                    try:
+                        text = paramGet.GetString("ContextPie").decode("UTF-8")
+                    except AttributeError:
+                        text = paramGet.GetString("ContextPie")
                 else:
-                    pass
+                    try:
+                        text = paramGet.GetString("CurrentPie").decode("UTF-8")
+                    except AttributeError:
+                        text = paramGet.GetString("CurrentPie")
+
+                for i in indexList:
+                    a = str(i)
+                    try:
+                        pie = paramIndexGet.GetString(a).decode("UTF-8")
+                    except AttributeError:
+                        pie = paramIndexGet.GetString(a)
+                    if pie == text:
+                        group = paramIndexGet.GetGroup(a)
+                        toolList = group.GetString("ToolList")
+                        pieIndex = a
+                    else:
+                        pass
 
             if toolList:
                 toolList = toolList.split(".,.")
             else:
                 toolList = []
 
-            actions = []
+            key = ("Pie", pieIndex, tuple(toolList)) + \
+                PieMenuInstance.layoutParams(group)
+
+            return key, group, toolList, None
 
-            actionMapAll = getGuiActionMapAll()
-            lastWorkbench = Gui.activeWorkbench()
-            
-            while actualizeWorkbenchActions(actions, toolList, actionMapAll):
-                actionMapAll = getGuiActionMapAll()
+
+    def pieActions(toolList, load=True):
+        """Return the actions of a tool list and whether all were resolved."""
+        actions = []
+        complete = True
+        actionMap = resolveActionMap(toolList, load=load)
+
+        for i in toolList:
+            if i in actionMap:
+                if actionMap[i] not in actions:
+                    actions.append(actionMap[i])
+            elif i and i not in commandQuarantine:
+                complete = False
             else:
                 pass
 
-            Gui.activateWorkbench(lastWorkbench.__class__.__name__)
+        return actions, complete
+
+
+    def updateCommands(context=False, pieIndex=None, prebuild=False):
+        """Build the current pie, or the pie with the given index.
+
+        A prebuild only fills the pie cache, it neither loads workbenches
+        nor changes the current pie.
+        """
+        key, group, toolList, actions = pieContent(context, pieIndex,
+                                                   load=not prebuild)
 
-        PieMenuInstance.add_commands(actions, context)
+        if prebuild:
+            if key in PieMenuInstance.cache:
+                return
+        elif PieMenuInstance.activate(key):
+            return
+
+        if toolList is not None:
+            actions, complete = pieActions(toolList, load=not prebuild)
+            actions = autoOrder(actions, group, key[1])
+
+            if not complete:
+                # not resolved yet, do not keep this build
+                key = None
+            else:
+                pass
+
+        if prebuild:
+            if key is not None:
+                PieMenuInstance.add_commands(actions, context, key, group, speculative=True)
+        else:
+            PieMenuInstance.add_commands(actions, context, key, group)
 
 
     def getGroup(mode=0):
@@ -1171,43 +3804,11 @@ def pieMenuStart():
         else:
             toolList = []
 
-        actionMapAll = getGuiActionMapAll()
-
         buttonListWidget.blockSignals(True)
 
         buttonListWidget.clear()
 
-        workbenches = []
-        lastWorkbench = Gui.activeWorkbench()
-
-        for i in toolList:
-            if i not in actionMapAll:
-                # rule out special case: there has to be an entry
-                if i == "":
-                    pass
-                else:
-                    cmd_parts = i.split("_")
-                    if cmd_parts[0] not in workbenches:
-                        # rule out special case: unknown Std action
-                        if cmd_parts[0] == "Std":
-                            pass
-                        else:
-                            # treatment of special cases
-                            # Fem workbench
-                            if cmd_parts[0] == "FEM":
-                                cmd_parts[0] = "Fem"
-                            # Sheet Metal workbench
-                            if cmd_parts[0][:2] == "SM":
-                                cmd_parts[0] = cmd_parts[0][:2]
-                            workbenches.append(cmd_parts[0])
-                            Gui.activateWorkbench(cmd_parts[0] + "Workbench")
-                    else:
-                        pass
-            else:
-                pass
-
-        Gui.activateWorkbench(lastWorkbench.__class__.__name__)
-        actionMapAll = getGuiActionMapAll()
+        actionMapAll = resolveActionMap(toolList)
 
         for i in toolList:
             if i in actionMapAll:
@@ -1226,6 +3827,11 @@ def pieMenuStart():
 
 
     def cBoxUpdate():
+        nonlocal workbenchPiesDirty
+
+        workbenchPiesDirty = True
+        updatePieShortcuts()
+
         paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
         paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
         indexList = paramIndexGet.GetString("IndexList")
@@ -1283,6 +3889,10 @@ def pieMenuStart():
         toolList()
         setDefaults()
         setCheckContext()
+        setWorkbench()
+        setShortcut()
+        setAutoOrder()
+        quarantineUpdate()
 
     cBox.currentIndexChanged.connect(onPieChange)
 
@@ -1404,6 +4014,9 @@ def pieMenuStart():
                 except TypeError:
                     paramIndexGet.SetString(indexNumber, text)
 
+                # sub-pie entries of a removed pie with this index are valid again
+                releaseCommand("PieMenu_Pie_" + indexNumber)
+
             cBoxUpdate()
 
         return paramIndexGet.GetGroup(indexNumber)
@@ -1428,6 +4041,8 @@ def pieMenuStart():
 
 
     def onButtonRemovePieMenu():
+        invalidatePie()
+
         paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
         paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
         indexList = paramIndexGet.GetString("IndexList")
@@ -1463,6 +4078,8 @@ def pieMenuStart():
 
                 paramIndexGet.RemGroup(a)
                 paramIndexGet.RemString(a)
+                # the index may be reused, drop references to this pie
+                removeToolListEntries(["PieMenu_Pie_" + a])
                 # special case treatment                                             
                 if pie == currentPie:
                     currentPie = "Default"
@@ -1551,6 +4168,12 @@ def pieMenuStart():
 
         return "-1"
 
+    def invalidatePie():
+        """Drop the cached builds of the pie edited in the preferences."""
+        index = getCurrentMenuIndex(cBox.currentText())
+
+        PieMenuInstance.invalidate(index)
+
     def copyIndexParams(grpOrg, grpCopy):
         
         valButOrg = grpOrg.GetInt("Button")
@@ -1644,16 +4267,107 @@ def pieMenuStart():
     
     buttonCopyPieMenu.clicked.connect(onButtonCopyPieMenu)
 
+    labelQuarantine = QtGui.QLabel()
+    buttonQuarantine = QtGui.QPushButton("Remove")
+    buttonQuarantine.setToolTip("Remove the commands their workbench no longer\n"
+                                "provides from all pie menus")
+
+
+    def quarantineUpdate():
+
+        commands = sorted(commandQuarantine)
+
+        labelQuarantine.setText("Unavailable commands: " + str(len(commands)))
+        labelQuarantine.setToolTip("\n".join(commands))
+        buttonQuarantine.setEnabled(len(commands) != 0)
+
+
+    def removeToolListEntries(entries):
+        """Remove the entries from the tool lists of all pies."""
+        paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
+        indexList = paramIndexGet.GetString("IndexList")
+        indexList = splitIndexList(indexList)
+
+        for i in indexList:
+            group = paramIndexGet.GetGroup(str(i))
+            toolList = group.GetString("ToolList")
+
+            if toolList:
+                toolList = toolList.split(".,.")
+            else:
+                toolList = []
+
+            cleaned = []
+
+            for a in toolList:
+                if a not in entries:
+                    cleaned.append(a)
+                else:
+                    pass
+
+            if len(cleaned) != len(toolList):
+                group.SetString("ToolList", ".,.".join(cleaned))
+                PieMenuInstance.invalidate(str(i))
+            else:
+                pass
+
+
+    def onButtonQuarantine():
+        """Remove the quarantined entries that are confirmed unavailable.
+
+        Only the workbenches the command cache recorded for them are
+        loaded. Commands without a recorded workbench stay in the pies.
+        """
+        installed = Gui.listWorkbenches()
+        workbenches = []
+
+        for i in commandQuarantine:
+            workbench = quarantineWorkbenches.get(i)
+            if workbench in installed and workbench not in workbenches:
+                workbenches.append(workbench)
+            else:
+                pass
+
+        if workbenches:
+            loadWorkbenches(workbenches)
+            actionMap = getGuiActionMapAll()
+        else:
+            actionMap = {}
+
+        unavailable = set()
+
+        for i in commandQuarantine:
+            if i.startswith("PieMenu_"):
+                if specialAction(i) is None:
+                    unavailable.add(i)
+                else:
+                    pass
+            elif i in actionMap or quarantineWorkbenches.get(i) is None:
+                pass
+            else:
+                unavailable.add(i)
+
+        removeToolListEntries(unavailable)
+
+        for i in list(commandQuarantine):
+            releaseCommand(i)
+
+        onPieChange()
+
+    buttonQuarantine.clicked.connect(onButtonQuarantine)
+
     labelRadius = QtGui.QLabel("Pie size")
     spinRadius = QtGui.QSpinBox()
     spinRadius.setMaximum(9999)
     spinRadius.setMinimumWidth(70)
+    spinRadius.setToolTip("Radius of the first ring and spacing of further rings")
 
 
     def onSpinRadius():
         group = getGroup()
         value = spinRadius.value()
         group.SetInt("Radius", value)
+        invalidatePie()
 
     spinRadius.valueChanged.connect(onSpinRadius)
 
@@ -1661,15 +4375,120 @@ def pieMenuStart():
     spinButton = QtGui.QSpinBox()
     spinButton.setMaximum(999)
     spinButton.setMinimumWidth(70)
+    spinButton.setToolTip("Maximum button size")
 
 
     def onSpinButton():
         group = getGroup()
         value = spinButton.value()
         group.SetInt("Button", value)
+        invalidatePie()
 
     spinButton.valueChanged.connect(onSpinButton)
 
+    labelWorkbench = QtGui.QLabel("Workbench")
+    comboWorkbench = QtGui.QComboBox()
+    comboWorkbench.setMinimumWidth(140)
+    comboWorkbench.setToolTip("Select this pie menu when the workbench is activated")
+    checkEditMode = QtGui.QCheckBox("Edit mode")
+    checkEditMode.setToolTip("Use this pie menu only while an object is in edit mode")
+
+
+    def setWorkbench():
+        group = getGroup()
+        current = group.GetString("Workbench")
+        workbenches = Gui.listWorkbenches()
+
+        comboWorkbench.blockSignals(True)
+        comboWorkbench.clear()
+        comboWorkbench.addItem("None", "")
+
+        for i in sorted(workbenches):
+            comboWorkbench.addItem(getattr(workbenches[i], "MenuText", i), i)
+            if i == current:
+                comboWorkbench.setCurrentIndex(comboWorkbench.count() - 1)
+            else:
+                pass
+
+        comboWorkbench.blockSignals(False)
+
+        checkEditMode.blockSignals(True)
+        checkEditMode.setChecked(group.GetBool("EditMode"))
+        checkEditMode.blockSignals(False)
+
+
+    def onComboWorkbench():
+        nonlocal workbenchPiesDirty
+
+        group = getGroup()
+        group.SetString("Workbench", comboWorkbench.itemData(comboWorkbench.currentIndex()))
+        workbenchPiesDirty = True
+
+    comboWorkbench.currentIndexChanged.connect(onComboWorkbench)
+
+
+    def onCheckEditMode():
+        nonlocal workbenchPiesDirty
+
+        group = getGroup()
+        group.SetBool("EditMode", checkEditMode.isChecked())
+        workbenchPiesDirty = True
+
+    checkEditMode.stateChanged.connect(onCheckEditMode)
+
+    labelAutoOrder = QtGui.QLabel("Slice order")
+    checkAutoOrder = QtGui.QCheckBox("By usage")
+    checkAutoOrder.setToolTip("Put the most used commands in the fastest to reach directions")
+
+
+    def setAutoOrder():
+        group = getGroup()
+
+        checkAutoOrder.blockSignals(True)
+        checkAutoOrder.setChecked(group.GetBool("AutoOrder"))
+        checkAutoOrder.blockSignals(False)
+
+
+    def onCheckAutoOrder():
+        group = getGroup()
+        group.SetBool("AutoOrder", checkAutoOrder.isChecked())
+
+        invalidatePie()
+
+    checkAutoOrder.stateChanged.connect(onCheckAutoOrder)
+
+    labelShortcut = QtGui.QLabel("Shortcut")
+    lineShortcut = QtGui.QLineEdit()
+    lineShortcut.setMaximumWidth(140)
+    lineShortcut.setPlaceholderText("None")
+    lineShortcut.setToolTip("Key sequence opening this pie menu directly, e.g. Shift+Q")
+
+
+    def setShortcut():
+        group = getGroup()
+
+        lineShortcut.blockSignals(True)
+        lineShortcut.setText(group.GetString("Shortcut"))
+        lineShortcut.blockSignals(False)
+
+
+    def onLineShortcut():
+        group = getGroup()
+        shortcut = QtGui.QKeySequence(lineShortcut.text().strip()).toString()
+
+        if shortcut:
+            group.SetString("Shortcut", shortcut)
+        else:
+            group.RemString("Shortcut")
+
+        lineShortcut.blockSignals(True)
+        lineShortcut.setText(shortcut)
+        lineShortcut.blockSignals(False)
+
+        updatePieShortcuts()
+
+    lineShortcut.editingFinished.connect(onLineShortcut)
+
     toolListWidget = QtGui.QListWidget()
     toolListWidget.setSortingEnabled(True)
     toolListWidget.sortItems(QtCore.Qt.AscendingOrder)
@@ -1721,7 +4540,26 @@ def pieMenuStart():
                 group = paramIndexGet.GetGroup(a)
                 toolListOn = group.GetString("ToolList")
             else:
-                pass
+                # other pies can be entered as sub-pies
+                item = QtGui.QListWidgetItem(toolListWidget)
+                item.setText("Pie: " + pie)
+                item.setIcon(QtGui.QIcon(iconSubPie))
+                item.setCheckState(QtCore.Qt.CheckState(0))
+                item.setData(QtCore.Qt.UserRole, "PieMenu_Pie_" + a)
+
+        for i in macroList():
+            item = QtGui.QListWidgetItem(toolListWidget)
+            item.setText("Macro: " + os.path.splitext(i)[0])
+            item.setIcon(QtGui.QIcon(":/icons/applications-python.svg"))
+            item.setCheckState(QtCore.Qt.CheckState(0))
+            item.setData(QtCore.Qt.UserRole, "PieMenu_Macro_" + i)
+
+        for i in dialProperties():
+            item = QtGui.QListWidgetItem(toolListWidget)
+            item.setText("Dial: " + i)
+            item.setIcon(QtGui.QIcon(iconDial))
+            item.setCheckState(QtCore.Qt.CheckState(0))
+            item.setData(QtCore.Qt.UserRole, "PieMenu_Dial_" + i)
 
         if toolListOn:
             toolListOn = toolListOn.split(".,.")
@@ -1815,6 +4653,7 @@ def pieMenuStart():
             else:
                 pass
 
+        invalidatePie()
         buttonList()
 
     toolListWidget.itemChanged.connect(onToolListWidget)
@@ -1832,6 +4671,7 @@ def pieMenuStart():
 
         group = getGroup()
         group.SetString("ToolList", ".,.".join(toolData))
+        invalidatePie()
 
 
     buttonUp = QtGui.QToolButton()
@@ -2302,11 +5142,36 @@ def pieMenuStart():
         layoutButton.addStretch(1)
         layoutButton.addWidget(spinButton)
 
+        layoutWorkbench = QtGui.QHBoxLayout()
+        layoutWorkbench.addWidget(labelWorkbench)
+        layoutWorkbench.addStretch(1)
+        layoutWorkbench.addWidget(checkEditMode)
+        layoutWorkbench.addWidget(comboWorkbench)
+
+        layoutAutoOrder = QtGui.QHBoxLayout()
+        layoutAutoOrder.addWidget(labelAutoOrder)
+        layoutAutoOrder.addStretch(1)
+        layoutAutoOrder.addWidget(checkAutoOrder)
+
+        layoutShortcut = QtGui.QHBoxLayout()
+        layoutShortcut.addWidget(labelShortcut)
+        layoutShortcut.addStretch(1)
+        layoutShortcut.addWidget(lineShortcut)
+
+        layoutQuarantine = QtGui.QHBoxLayout()
+        layoutQuarantine.addWidget(labelQuarantine)
+        layoutQuarantine.addStretch(1)
+        layoutQuarantine.addWidget(buttonQuarantine)
+
         pieMenuTabLayout.insertLayout(0, layoutAddRemove)
         pieMenuTabLayout.insertSpacing(1, 24)
         pieMenuTabLayout.insertLayout(2, layoutRadius)
         pieMenuTabLayout.insertLayout(3, layoutButton)
+        pieMenuTabLayout.insertLayout(4, layoutWorkbench)
+        pieMenuTabLayout.insertLayout(5, layoutShortcut)
+        pieMenuTabLayout.insertLayout(6, layoutAutoOrder)
         pieMenuTabLayout.addStretch(0)
+        pieMenuTabLayout.addLayout(layoutQuarantine)
 
         contextTab = QtGui.QWidget()
         contextTabLayout = QtGui.QVBoxLayout()
@@ -2382,6 +5247,14 @@ def pieMenuStart():
                 t.stop()
                 t.deleteLater()
                 accessoriesMenu()
+                mw.workbenchActivated.connect(toolBarIndex.onWorkbenchActivated)
+                mw.workbenchActivated.connect(searchIndex.onWorkbenchActivated)
+                mw.workbenchActivated.connect(onWorkbenchActivated)
+                mw.mainWindowClosed.connect(flushUsage)
+                updatePieShortcuts()
+                # the startup workbench is already active, warm the index
+                # now instead of on the first keystroke
+                searchTimer.start()
 
 
     mw = Gui.getMainWindow()
@@ -2424,6 +5297,46 @@ def pieMenuStart():
         addObserver()
 
         PieMenuInstance = PieMenu()
+        toolBarIndex = ToolBarIndex()
+        searchIndex = SearchIndex()
+
+        prebuildTimer = QtCore.QTimer()
+        prebuildTimer.setSingleShot(True)
+        prebuildTimer.setInterval(0)
+        prebuildTimer.timeout.connect(onPrebuildTimer)
+
+        commandCacheTimer = QtCore.QTimer()
+        commandCacheTimer.setSingleShot(True)
+        commandCacheTimer.setInterval(2000)
+        commandCacheTimer.timeout.connect(saveCommandCache)
+
+        macroWatcher = QtCore.QFileSystemWatcher()
+        macroWatcher.fileChanged.connect(onMacroChanged)
+
+        dynamicTimer = QtCore.QTimer()
+        dynamicTimer.setSingleShot(True)
+        dynamicTimer.setInterval(50)
+        dynamicTimer.timeout.connect(onDynamicTimer)
+
+        usageTimer = QtCore.QTimer()
+        usageTimer.setSingleShot(True)
+        usageTimer.setInterval(30000)
+        usageTimer.timeout.connect(flushUsage)
+
+        searchTimer = QtCore.QTimer()
+        searchTimer.setSingleShot(True)
+        searchTimer.setInterval(0)
+        searchTimer.timeout.connect(searchIndex.update)
+
+        repeatAction = QtGui.QAction(mw)
+        repeatAction.setText("Repeat last pie command")
+        repeatAction.setObjectName("PieMenuRepeat")
+        repeatAction.setIcon(QtGui.QIcon(iconSubPie))
+        repeatAction.setEnabled(False)
+        repeatAction.setShortcut(QtGui.QKeySequence(App.ParamGet("User parameter:BaseApp/PieMenu")
+                                                    .GetString("RepeatShortcut")))
+        repeatAction.triggered.connect(repeatLastCommand)
+        mw.addAction(repeatAction)
 
         actionKey = QtGui.QAction(mw)
         actionKey.setText("Invoke pie menu")
@@ -0,0 +1,314 @@
+# Pie menu for FreeCAD
+# Copyright (C) 2023  mdkus @ FreeCAD
+#
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+"""Pie menu for FreeCAD - Core.
+
+State transitions, layout, search, usage scores and the trace format.
+Nothing here needs FreeCAD or Qt, so it can be tested with plain Python.
+"""
+
+
+import heapq
+import json
+import math
+import re
+
+import PieMenuStats as stats
+
+
+# what a key press does in each state of the pie
+KEY_TRANSITIONS = {
+    "Idle": "Show",
+    "Gesture": "Hide",
+    "Normal": "Hide",
+    "Context": "Hide",
+    "Dynamic": "Hide",
+    }
+
+
+def keyTransition(state, triggerMode):
+    """Return "Show", "Gesture" or "Hide" for a key press in the state."""
+    transition = KEY_TRANSITIONS[state]
+
+    if transition == "Show" and triggerMode == "Gesture":
+        return "Gesture"
+    else:
+        return transition
+
+
+def keyTarget(contextIndex, selected, enableContext, editPie, dynamicMode):
+    """Return the state and pie index shown by a key press.
+
+    A context pie needs a matching selection, an edit mode pie wins over
+    the dynamic pie and the dynamic pie needs a selection.
+    """
+    if contextIndex is None or not selected or not enableContext:
+        state = "Normal"
+    else:
+        state = "Context"
+
+    if state == "Normal":
+        pieIndex = editPie
+    else:
+        pieIndex = None
+
+    if state == "Normal" and pieIndex is None and dynamicMode and selected:
+        state = "Dynamic"
+    else:
+        pass
+
+    return state, pieIndex
+
+
+def pieLayout(count, radius, buttonSize, minButton, maxRings):
+    """Return the button size and slots of a pie with count commands.
+
+    Commands stay on one ring while the buttons keep the minimum size.
+    Otherwise they fill concentric rings spaced by the radius, and
+    pages once the maximum number of rings is used.
+    """
+    if count <= 1:
+        size = buttonSize
+        rings = [radius]
+    else:
+        buttonRadius = math.sin(math.pi / count) * radius
+        size = min(buttonSize, math.trunc(2 * buttonRadius / math.sqrt(2)))
+
+        if size >= minButton:
+            rings = [radius]
+        else:
+            size = minButton
+            # adjacent rings must not overlap
+            spacing = max(radius, size * math.sqrt(2) + 2)
+            rings = []
+            for i in range(maxRings):
+                rings.append(radius + i * spacing)
+
+    capacities = []
+
+    for i in rings:
+        chord = size * math.sqrt(2) / (2 * i)
+        if len(rings) == 1:
+            capacities.append(max(count, 1))
+        elif chord < 1:
+            capacities.append(max(int(math.pi / math.asin(chord)), 1))
+        else:
+            capacities.append(1)
+
+    # slot: (x, y, angle, ring radius, page)
+    slots = []
+    outer = rings[0]
+    page = 0
+    remaining = count
+
+    while remaining > 0:
+        for ring, capacity in zip(rings, capacities):
+            number = min(capacity, remaining)
+
+            if number == 0:
+                break
+            elif number == 1:
+                angle = 0
+            else:
+                angle = 2 * math.pi / number
+
+            angleStart = 3 * math.pi / 2 - angle
+
+            for num in range(1, number + 1):
+                a = angle * num + angleStart
+                slots.append((ring * math.cos(a),
+                              ring * math.sin(a),
+                              a % (2 * math.pi),
+                              ring,
+                              page))
+
+            outer = max(outer, ring)
+            remaining = remaining - number
+
+        page = page + 1
+
+    return {"ButtonSize": size,
+            "Slots": slots,
+            "Pages": max(page, 1),
+            "Outer": outer}
+
+
+class SearchIndex:
+    """Trigram and prefix index over command name, menu text and tooltip."""
+
+    def __init__(self):
+        self.texts = {}
+        self.titles = {}
+        self.grams = {}
+        self.prefixes = {}
+
+    def words(self, text):
+        return [i for i in re.split(r"[\W_]+", text.lower()) if i]
+
+    def add(self, command, menuText, toolTip):
+        if command in self.texts:
+            return
+
+        title = menuText.replace("&", "")
+        text = " ".join([command, title, toolTip]).lower()
+
+        self.texts[command] = text
+        self.titles[command] = title.lower()
+
+        for word in set(self.words(text)):
+            for n in range(1, min(len(word), 2) + 1):
+                self.prefixes.setdefault(word[:n], set()).add(command)
+            for n in range(len(word) - 2):
+                self.grams.setdefault(word[n:n + 3], set()).add(command)
+
+        stats.count("searchIndex.add")
+
+    def match(self, token):
+        if len(token) < 3:
+            return self.prefixes.get(token, set())
+
+        commands = None
+
+        for n in range(len(token) - 2):
+            gram = self.grams.get(token[n:n + 3], set())
+            if commands is None:
+                commands = gram
+            else:
+                commands = commands & gram
+            if not commands:
+                return set()
+
+        return set(i for i in commands if token in self.texts[i])
+
+    def search(self, text, limit, score=None, exclude=()):
+        """Return the best matches, highest score first.
+
+        Ties go to titles starting with the first word, then by title.
+        """
+        tokens = self.words(text)
+        commands = None
+
+        for token in tokens:
+            if commands is None:
+                commands = self.match(token)
+            else:
+                commands = commands & self.match(token)
+            if not commands:
+                return []
+
+        if commands is None:
+            return []
+
+        def rank(command):
+            title = self.titles[command]
+            if score is None:
+                value = 0
+            else:
+                value = score(command)
+            return (-value, not title.startswith(tokens[0]), title)
+
+        commands = [i for i in commands if i not in exclude]
+
+        return heapq.nsmallest(limit, commands, key=rank)
+
+
+def decayedScore(entry, now, halfLife):
+    """Return the score of a [score, time] entry decayed to now."""
+    return entry[0] * 0.5 ** ((now - entry[1]) / halfLife)
+
+
+def addUse(scores, command, now, halfLife):
+    """Count one use of the command in the scores."""
+    if command in scores:
+        scores[command] = [decayedScore(scores[command], now, halfLife) + 1, now]
+    else:
+        scores[command] = [1, now]
+
+
+def slotOrder(slots):
+    """Return the slot indices, fastest to reach first.
+
+    The first page and the inner ring come first, and on a ring the four
+    axis directions before the diagonals.
+    """
+    quarter = math.pi / 2
+
+    def slotCost(n):
+        offset = slots[n][2] % quarter
+        return (slots[n][4], slots[n][3], round(min(offset, quarter - offset), 6), n)
+
+    return sorted(range(len(slots)), key=slotCost)
+
+
+def orderByScore(items, scores, slots):
+    """Put the highest scored items on the fastest to reach slots."""
+    if not any(scores.values()):
+        return list(items)
+
+    order = slotOrder(slots[:len(items)])
+    ranked = sorted(items, key=lambda i: -scores[i])
+
+    result = list(items)
+
+    for n, item in zip(order, ranked):
+        result[n] = item
+
+    return result
+
+
+TRACE_VERSION = 2
+
+
+class TraceError(ValueError):
+    """The trace file cannot be read."""
+
+
+def writeTrace(path, steps):
+    """Write the steps as a trace file."""
+    with open(path, "w") as f:
+        f.write(json.dumps({"Version": TRACE_VERSION, "Steps": len(steps)}) + "\n")
+        for i in steps:
+            f.write(json.dumps(i, separators=(",", ":")) + "\n")
+
+
+def loadTrace(path):
+    """Return the steps of a trace file."""
+    trace = []
+
+    with open(path) as f:
+        try:
+            header = json.loads(f.readline())
+        except ValueError:
+            raise TraceError("no trace header")
+
+        if not isinstance(header, dict) or header.get("Version") != TRACE_VERSION:
+            version = header.get("Version") if isinstance(header, dict) else None
+            raise TraceError("unsupported trace version {}".format(version))
+
+        for n, line in enumerate(f):
+            if not line.strip():
+                continue
+            try:
+                step = json.loads(line)
+            except ValueError:
+                raise TraceError("invalid step on line {}".format(n + 2))
+            if not isinstance(step, list) or len(step) < 2:
+                raise TraceError("invalid step on line {}".format(n + 2))
+            trace.append(step)
+
+    return trace
@@ -0,0 +1,341 @@
+# Pie menu for FreeCAD
+# Copyright (C) 2023  mdkus @ FreeCAD
+#
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+"""Pie menu for FreeCAD - Session recorder.
+
+Records pie menu interaction into a compact trace and replays it through
+the same entry points to measure the latency of every step.
+
+Run from the FreeCAD Python console:
+
+    import PieMenuRecorder
+    PieMenuRecorder.start()
+    # ... use the pie menu ...
+    PieMenuRecorder.stop("/tmp/session.pietrace")
+    PieMenuRecorder.replay("/tmp/session.pietrace")
+
+Trace format: a JSON header line followed by one JSON array per step,
+[time in ms, kind, fields...]:
+
+    key       x, y, pie index or null    Tab or a pie shortcut
+    slice     command, x, y              slice chosen in the pie
+    quick     menu titles, text          quick menu action by its path
+    select    document, object, element  selection added
+    deselect  document, object, element  selection removed
+    clear                                selection cleared
+"""
+
+
+import time
+
+import FreeCAD as App
+import FreeCADGui as Gui
+from PySide import QtCore
+from PySide import QtGui
+
+import PieMenuCore as core
+import PieMenuStats as stats
+
+
+VERSION = core.TRACE_VERSION
+
+steps = None
+started = 0
+
+
+class ReplayFailure(Exception):
+    """A step of the trace could not be replayed."""
+
+
+class SelectionRecorder:
+    """Record the inputs of the selection observer."""
+
+    def addSelection(self, doc, obj, sub, pnt):
+        record("select", doc, obj, sub)
+
+    def removeSelection(self, doc, obj, sub):
+        record("deselect", doc, obj, sub)
+
+    def clearSelection(self, doc):
+        record("clear")
+
+
+selectionRecorder = SelectionRecorder()
+
+
+def menuPath(menu, action):
+    """Return the submenu titles and text leading to the action, or None."""
+    for i in menu.actions():
+        if i is action:
+            return [i.text()]
+        elif i.menu() is not None:
+            path = menuPath(i.menu(), action)
+            if path is not None:
+                return [i.text()] + path
+        else:
+            pass
+
+    return None
+
+
+def recordQuick(menu, action):
+    """Record a quick menu action by its path, texts repeat in submenus."""
+    if steps is None:
+        return
+
+    path = menuPath(menu, action)
+
+    if path is not None:
+        record("quick", *path)
+    else:
+        pass
+
+
+def recording():
+    """Return True while a session is recorded."""
+    return steps is not None
+
+
+def record(kind, *fields):
+    """Append a step to the trace, a no-op unless recording."""
+    if steps is None:
+        return
+
+    steps.append([int((time.time() - started) * 1000), kind] + list(fields))
+
+
+def start():
+    """Start recording a session."""
+    global steps
+    global started
+
+    steps = []
+    started = time.time()
+    Gui.Selection.addObserver(selectionRecorder)
+
+
+def stop(path):
+    """Stop recording and write the trace, return the number of steps."""
+    global steps
+
+    Gui.Selection.removeObserver(selectionRecorder)
+
+    trace = steps or []
+    steps = None
+
+    core.writeTrace(path, trace)
+
+    return len(trace)
+
+
+def load(path):
+    """Return the steps of a trace file."""
+    try:
+        return core.loadTrace(path)
+    except core.TraceError as e:
+        raise ReplayFailure(str(e))
+
+
+def wait(timeout):
+    """Process events, timers included, for the timeout in ms."""
+    app = QtGui.QApplication.instance()
+    clock = QtCore.QElapsedTimer()
+    clock.start()
+
+    while clock.elapsed() < timeout:
+        app.processEvents(QtCore.QEventLoop.AllEvents, 10)
+
+
+def settle(timeout=1000):
+    """Process the pending events, for at most the timeout in ms."""
+    app = QtGui.QApplication.instance()
+
+    # returns once no events are left or the deadline has passed
+    app.processEvents(QtCore.QEventLoop.AllEvents, timeout)
+    QtCore.QCoreApplication.sendPostedEvents()
+
+
+def shortCut(pie):
+    """Return the action invoking the pie, or the current pie if None."""
+    mw = Gui.getMainWindow()
+
+    if pie is None:
+        name = "PieMenuShortCut"
+    else:
+        name = "PieMenuShortCut_" + pie
+
+    for i in mw.findChildren(QtGui.QAction):
+        if i.objectName() == name:
+            return i
+
+    raise ReplayFailure("no shortcut action " + name)
+
+
+def visibleButtons():
+    """Return the tool buttons of the visible pie."""
+    mw = Gui.getMainWindow()
+    buttons = []
+
+    for i in mw.findChildren(QtGui.QMenu):
+        if i.isVisible():
+            buttons.extend(i.findChildren(QtGui.QToolButton))
+
+    return [i for i in buttons if i.isVisible()]
+
+
+def command(action):
+    """Return the tool list entry recorded for an action."""
+    return action.objectName() or action.property("Command") or \
+        action.property("SubPie") or ""
+
+
+def findQuickAction(menu, path):
+    """Return the action at the path of the quick menu, or None."""
+    # pie and toolbar lists are filled when shown
+    menu.aboutToShow.emit()
+
+    for i in menu.actions():
+        if i.text() != path[0]:
+            continue
+
+        if len(path) == 1:
+            return i
+
+        if i.menu() is None:
+            # toolbar submenus are created when first hovered
+            menu.hovered.emit(i)
+
+        if i.menu() is not None:
+            return findQuickAction(i.menu(), path[1:])
+        else:
+            return None
+
+    return None
+
+
+def replayStep(step, gestureDelay):
+    kind = step[1]
+
+    if kind == "key":
+        QtGui.QCursor.setPos(step[2], step[3])
+        shortCut(step[4]).trigger()
+    elif kind == "slice":
+        flicks = stats.get("gesture.flick")
+        QtGui.QCursor.setPos(step[3], step[4])
+        buttons = visibleButtons()
+        for i in buttons:
+            action = i.defaultAction()
+            if action is not None and command(action) == step[2]:
+                event = QtGui.QMouseEvent(QtCore.QEvent.MouseButtonRelease,
+                                          QtCore.QPoint(1, 1),
+                                          QtCore.Qt.LeftButton,
+                                          QtCore.Qt.LeftButton,
+                                          QtCore.Qt.NoModifier)
+                QtGui.QApplication.sendEvent(i, event)
+                return
+        if not buttons:
+            # no pie shown, the slice is chosen by a gesture
+            clock = QtCore.QElapsedTimer()
+            clock.start()
+            while stats.get("gesture.flick") == flicks and clock.elapsed() < gestureDelay:
+                wait(10)
+            if stats.get("gesture.flick") != flicks:
+                return
+        raise ReplayFailure("no slice " + step[2])
+    elif kind == "quick":
+        for i in visibleButtons():
+            if i.menu() is not None:
+                action = findQuickAction(i.menu(), step[2:])
+                if action is not None:
+                    action.trigger()
+                    return
+        raise ReplayFailure("no quick menu action " + " > ".join(step[2:]))
+    elif kind == "select":
+        if step[4]:
+            Gui.Selection.addSelection(step[2], step[3], step[4])
+        else:
+            Gui.Selection.addSelection(step[2], step[3])
+    elif kind == "deselect":
+        if step[4]:
+            Gui.Selection.removeSelection(step[2], step[3], step[4])
+        else:
+            Gui.Selection.removeSelection(step[2], step[3])
+    elif kind == "clear":
+        Gui.Selection.clearSelection()
+    else:
+        raise ReplayFailure("unknown step " + kind)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def replay(path, realtime=False, strict=False):
+    """Replay a trace and return the per-step latencies in ms.
+
+    Steps run back to back unless realtime is True. A step that cannot be
+    replayed is reported and skipped, or raises ReplayFailure if strict.
+    """
+    paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+    gestureDelay = paramGet.GetInt("GestureDelay", 250) * 2
+
+    trace = load(path)
+    latencies = []
+    failures = []
+    clock = QtCore.QElapsedTimer()
+    replayed = time.time()
+
+    for n, step in enumerate(trace):
+        if realtime:
+            delay = step[0] / 1000.0 - (time.time() - replayed)
+            if delay > 0:
+                # timers have to fire during the recorded pauses
+                wait(delay * 1000)
+
+        clock.start()
+
+        try:
+            replayStep(step, gestureDelay)
+        except ReplayFailure as e:
+            if strict:
+                raise
+            failures.append((n, str(e)))
+            continue
+
+        settle()
+        latencies.append((n, step[1], clock.nsecsElapsed() / 1e6))
+
+    report = {"steps": len(trace), "failures": failures, "latencies": latencies}
+
+    kinds = sorted(set(i[1] for i in latencies))
+
+    for kind in kinds:
+        values = [i[2] for i in latencies if i[1] == kind]
+        report[kind] = {"count": len(values),
+                        "mean": sum(values) / len(values),
+                        "p50": percentile(values, 0.5),
+                        "p95": percentile(values, 0.95),
+                        "max": max(values)}
+        App.Console.PrintMessage("PieMenu replay: {}: {}\n".format(kind, report[kind]))
+
+    for n, message in failures:
+        App.Console.PrintWarning("PieMenu replay: step {}: {}\n".format(n, message))
+
+    return report
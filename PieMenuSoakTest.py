@@ -0,0 +1,284 @@
+# Pie menu for FreeCAD
+# Copyright (C) 2023  mdkus @ FreeCAD
+#
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+"""Pie menu for FreeCAD - Soak test.
+
+Drives a long session of simulated pie menu usage and reports the growth
+of live QObjects, Python objects and resident memory.
+
+Run from the FreeCAD Python console:
+
+    import PieMenuSoakTest
+    PieMenuSoakTest.run()
+"""
+
+
+import gc
+import os
+import random
+
+import FreeCAD as App
+import FreeCADGui as Gui
+from PySide import QtCore
+from PySide import QtGui
+
+import PieMenuStats as stats
+
+
+class SoakTestFailure(Exception):
+    """Resource growth exceeded the allowed threshold."""
+
+
+def rss():
+    """Return the resident set size in bytes, 0 if unknown."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, AttributeError):
+        return 0
+
+
+def processEvents():
+    """Flush pending events including deferred deletions."""
+    app = QtGui.QApplication.instance()
+    app.processEvents()
+    QtCore.QCoreApplication.sendPostedEvents(None, QtCore.QEvent.DeferredDelete)
+    app.processEvents()
+
+
+def measure(mw):
+    """Return a snapshot of the tracked resources."""
+    processEvents()
+    gc.collect()
+
+    return {
+        "qobjects": len(mw.findChildren(QtCore.QObject)),
+        "widgets": len(QtGui.QApplication.allWidgets()),
+        "pyobjects": len(gc.get_objects()),
+        "rss": rss(),
+        }
+
+
+def pieNames():
+    """Return the names of all configured pies."""
+    paramIndexGet = App.ParamGet("User parameter:BaseApp/PieMenu/Index")
+    indexList = paramIndexGet.GetString("IndexList")
+
+    names = []
+
+    if indexList:
+        for i in indexList.split(".,."):
+            try:
+                names.append(paramIndexGet.GetString(i).decode("UTF-8"))
+            except AttributeError:
+                names.append(paramIndexGet.GetString(i))
+
+    return names
+
+
+def toolBarNames(mw):
+    """Return the object names of all toolbars with actions."""
+    names = []
+
+    for i in mw.findChildren(QtGui.QToolBar):
+        if i.objectName() and i.actions():
+            names.append(i.objectName())
+
+    return names
+
+
+def syntheticDocument():
+    """Create a scratch document with an object to select."""
+    doc = App.newDocument("PieMenuSoak")
+
+    try:
+        doc.addObject("Part::Box", "Box")
+        subElements = ["Vertex1", "Vertex2", "Edge1", "Edge2", "Face1", "Face2"]
+    except Exception:
+        doc.addObject("App::FeaturePython", "Box")
+        subElements = [""]
+
+    doc.recompute()
+
+    return doc, subElements
+
+
+def run(iterations=5000,
+        warmup=200,
+        seed=0,
+        maxQObjects=50,
+        maxPyObjects=20000,
+        maxRss=64 * 1024 * 1024):
+    """Run the soak test and return the report.
+
+    Raises SoakTestFailure if the growth of any tracked resource exceeds
+    its threshold.
+    """
+    mw = Gui.getMainWindow()
+    paramGet = App.ParamGet("User parameter:BaseApp/PieMenu")
+
+    shortCut = None
+
+    for i in mw.findChildren(QtGui.QAction):
+        if i.objectName() == "PieMenuShortCut":
+            shortCut = i
+        else:
+            pass
+
+    if shortCut is None:
+        raise SoakTestFailure("PieMenu is not running")
+
+    savedCurrentPie = paramGet.GetString("CurrentPie")
+    savedToolBarMode = paramGet.GetBool("ToolBar")
+    savedToolBar = paramGet.GetString("ToolBar")
+
+    doc, subElements = syntheticDocument()
+    pies = pieNames()
+    toolBars = toolBarNames(mw)
+    rnd = random.Random(seed)
+
+    def onTab():
+        shortCut.trigger()
+
+    def onPieSwitch():
+        if pies:
+            paramGet.SetBool("ToolBar", False)
+            paramGet.RemString("ToolBar")
+            paramGet.SetString("CurrentPie", rnd.choice(pies))
+        shortCut.trigger()
+
+    def onToolBarToggle():
+        if toolBars and not paramGet.GetBool("ToolBar"):
+            paramGet.SetBool("ToolBar", True)
+            paramGet.SetString("ToolBar", rnd.choice(toolBars))
+        else:
+            paramGet.SetBool("ToolBar", False)
+            paramGet.RemString("ToolBar")
+        shortCut.trigger()
+
+    # selection events of the measured run
+    selections = [0]
+
+    def onSelection():
+        selections[0] = selections[0] + 1
+        sub = rnd.choice(subElements)
+        if rnd.random() < 0.3:
+            Gui.Selection.clearSelection()
+        elif sub:
+            Gui.Selection.addSelection(doc.Name, "Box", sub)
+        else:
+            Gui.Selection.addSelection(doc.Name, "Box")
+
+    events = [onTab, onTab, onTab, onPieSwitch, onToolBarToggle, onSelection]
+    # events that constructed more than one pie
+    overBuilt = []
+
+    def drive(count):
+        for i in range(count):
+            event = rnd.choice(events)
+            builds = stats.get("build")
+            event()
+            if stats.get("build") - builds > 1:
+                overBuilt.append((event.__name__, stats.get("build") - builds))
+            if i % 50 == 0:
+                processEvents()
+
+    def showPie():
+        """Show the current pie, return the pies constructed for it."""
+        shows = stats.get("show")
+        builds = stats.get("build")
+        shortCut.trigger()
+        if stats.get("show") == shows:
+            # the key hid an open pie
+            builds = stats.get("build")
+            shortCut.trigger()
+        processEvents()
+        return stats.get("build") - builds
+
+    try:
+        drive(warmup)
+        before = measure(mw)
+        countersBefore = stats.snapshot()
+        selections[0] = 0
+
+        drive(iterations)
+        after = measure(mw)
+        countersAfter = stats.snapshot()
+
+        # the second show of the same pie has to come from the cache
+        showPie()
+        shortCut.trigger()
+        repeatedBuilds = showPie()
+        shortCut.trigger()
+    finally:
+        Gui.Selection.clearSelection()
+        paramGet.SetString("CurrentPie", savedCurrentPie)
+        paramGet.SetBool("ToolBar", savedToolBarMode)
+        if savedToolBar:
+            paramGet.SetString("ToolBar", savedToolBar)
+        else:
+            paramGet.RemString("ToolBar")
+        App.closeDocument(doc.Name)
+        processEvents()
+
+    report = {"iterations": iterations,
+              "overBuilt": len(overBuilt),
+              "repeatedBuilds": repeatedBuilds}
+
+    for key in before:
+        report[key] = (before[key], after[key], after[key] - before[key])
+
+    for key in countersAfter:
+        report["count." + key] = countersAfter[key] - countersBefore.get(key, 0)
+
+    for key in sorted(report):
+        App.Console.PrintMessage("PieMenu soak: {}: {}\n".format(key, report[key]))
+
+    failures = []
+
+    if report["qobjects"][2] > maxQObjects:
+        failures.append("QObject count grew by {}".format(report["qobjects"][2]))
+    if report["pyobjects"][2] > maxPyObjects:
+        failures.append("Python object count grew by {}".format(report["pyobjects"][2]))
+    if report["rss"][2] > maxRss:
+        failures.append("RSS grew by {} bytes".format(report["rss"][2]))
+
+    # at most one construction per user or selection event
+    for name, builds in overBuilt[:5]:
+        failures.append("{} built {} pies".format(name, builds))
+    if repeatedBuilds:
+        failures.append("repeated show built {} pies".format(repeatedBuilds))
+
+    # the warmup filled the cache, prebuilt context pies still have to be used
+    prebuilds = report.get("count.prebuild", 0)
+    if prebuilds:
+        if report.get("count.prebuild.hit", 0) == 0:
+            failures.append("none of {} prebuilds was used".format(prebuilds))
+        wasted = report.get("count.prebuild.wasted", 0)
+        if wasted >= selections[0]:
+            failures.append("{} prebuilds wasted for {} selection events".format(wasted, selections[0]))
+
+    if failures:
+        raise SoakTestFailure(", ".join(failures))
+
+    return report
@@ -0,0 +1,42 @@
+# Pie menu for FreeCAD
+# Copyright (C) 2023  mdkus @ FreeCAD
+#
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+"""Pie menu for FreeCAD - Instrumentation counters."""
+
+
+counters = {}
+
+
+def count(name, value=1):
+    """Increment the named counter."""
+    counters[name] = counters.get(name, 0) + value
+
+
+def get(name):
+    """Return the value of the named counter."""
+    return counters.get(name, 0)
+
+
+def snapshot():
+    """Return a copy of all counters."""
+    return dict(counters)
+
+
+def reset():
+    """Reset all counters."""
+    counters.clear()
@@ -0,0 +1,240 @@
+"""Tests of the parts of the pie menu that need neither FreeCAD nor Qt."""
+
+
+import json
+import math
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PieMenuCore as core
+
+
+class TestTransitions(unittest.TestCase):
+
+    def test_key_shows_from_idle(self):
+        self.assertEqual(core.keyTransition("Idle", "Press"), "Show")
+        self.assertEqual(core.keyTransition("Idle", "Hover"), "Show")
+
+    def test_key_starts_gesture_from_idle(self):
+        self.assertEqual(core.keyTransition("Idle", "Gesture"), "Gesture")
+
+    def test_key_hides_every_other_state(self):
+        for state in ["Gesture", "Normal", "Context", "Dynamic"]:
+            for mode in ["Press", "Hover", "Gesture"]:
+                self.assertEqual(core.keyTransition(state, mode), "Hide")
+
+    def test_every_state_has_a_transition(self):
+        self.assertEqual(set(core.KEY_TRANSITIONS),
+                         {"Idle", "Gesture", "Normal", "Context", "Dynamic"})
+
+    def test_context_needs_selection_and_setting(self):
+        self.assertEqual(core.keyTarget("3", True, True, None, False), ("Context", None))
+        self.assertEqual(core.keyTarget("3", False, True, None, False), ("Normal", None))
+        self.assertEqual(core.keyTarget("3", True, False, None, False), ("Normal", None))
+        self.assertEqual(core.keyTarget(None, True, True, None, False), ("Normal", None))
+
+    def test_edit_pie_wins_over_dynamic(self):
+        self.assertEqual(core.keyTarget(None, True, True, "5", True), ("Normal", "5"))
+
+    def test_dynamic_needs_selection(self):
+        self.assertEqual(core.keyTarget(None, True, True, None, True), ("Dynamic", None))
+        self.assertEqual(core.keyTarget(None, False, True, None, True), ("Normal", None))
+
+    def test_context_wins_over_edit_pie(self):
+        self.assertEqual(core.keyTarget("3", True, True, "5", True), ("Context", None))
+
+
+class TestPieLayout(unittest.TestCase):
+
+    def test_single_ring(self):
+        layout = core.pieLayout(8, 100, 32, 24, 3)
+
+        self.assertEqual(len(layout["Slots"]), 8)
+        self.assertEqual(layout["Pages"], 1)
+        self.assertEqual(layout["Outer"], 100)
+        self.assertEqual(set(i[3] for i in layout["Slots"]), {100})
+
+    def test_four_slots_on_the_axes(self):
+        layout = core.pieLayout(4, 100, 32, 24, 3)
+        angles = sorted(round(i[2], 6) for i in layout["Slots"])
+
+        self.assertEqual(angles, [round(i * math.pi / 2, 6) for i in range(4)])
+
+    def test_slots_on_ring_radius(self):
+        for slot in core.pieLayout(12, 150, 32, 24, 3)["Slots"]:
+            self.assertAlmostEqual(math.hypot(slot[0], slot[1]), slot[3])
+
+    def test_many_commands_use_rings(self):
+        layout = core.pieLayout(40, 100, 32, 24, 3)
+        rings = sorted(set(i[3] for i in layout["Slots"]))
+
+        self.assertEqual(len(layout["Slots"]), 40)
+        self.assertGreater(len(rings), 1)
+        self.assertEqual(layout["ButtonSize"], 24)
+        self.assertEqual(layout["Outer"], rings[-1])
+
+    def test_overflow_goes_to_pages(self):
+        layout = core.pieLayout(200, 100, 32, 24, 2)
+
+        self.assertEqual(len(layout["Slots"]), 200)
+        self.assertGreater(layout["Pages"], 1)
+        self.assertEqual(max(i[4] for i in layout["Slots"]), layout["Pages"] - 1)
+
+    def test_no_commands(self):
+        layout = core.pieLayout(0, 100, 32, 24, 3)
+
+        self.assertEqual(layout["Slots"], [])
+        self.assertEqual(layout["Pages"], 1)
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = core.SearchIndex()
+        self.index.add("Part_Box", "&Cube", "Create a cube solid")
+        self.index.add("Part_Cylinder", "C&ylinder", "Create a cylinder solid")
+        self.index.add("Sketcher_NewSketch", "Create sketch", "Create a new sketch")
+        self.index.add("Part_Extrude", "Extrude...", "Extrude a sketch or face")
+
+    def test_prefix_and_trigram_match(self):
+        self.assertEqual(set(self.index.search("cy", 10)), {"Part_Cylinder"})
+        self.assertEqual(set(self.index.search("ylind", 10)), {"Part_Cylinder"})
+
+    def test_all_words_have_to_match(self):
+        self.assertEqual(self.index.search("create sketch", 10), ["Sketcher_NewSketch"])
+        self.assertEqual(self.index.search("cube sketch", 10), [])
+
+    def test_empty_query(self):
+        self.assertEqual(self.index.search("", 10), [])
+
+    def test_score_ranks_first(self):
+        scores = {"Part_Extrude": 5, "Sketcher_NewSketch": 1}
+        result = self.index.search("sketch", 10, score=lambda i: scores.get(i, 0))
+
+        self.assertEqual(result, ["Part_Extrude", "Sketcher_NewSketch"])
+
+    def test_title_prefix_breaks_ties(self):
+        result = self.index.search("sketch", 10)
+
+        self.assertEqual(result[0], "Sketcher_NewSketch")
+
+    def test_limit_and_exclude(self):
+        self.assertEqual(len(self.index.search("create", 2)), 2)
+        self.assertNotIn("Part_Box",
+                         self.index.search("create", 10, exclude={"Part_Box"}))
+
+    def test_add_is_idempotent(self):
+        self.index.add("Part_Box", "Other", "Other")
+
+        self.assertEqual(self.index.titles["Part_Box"], "cube")
+
+
+class TestUsage(unittest.TestCase):
+
+    day = 86400
+
+    def test_score_halves_after_half_life(self):
+        self.assertAlmostEqual(core.decayedScore([4, 0], 14 * self.day, 14 * self.day), 2)
+        self.assertAlmostEqual(core.decayedScore([4, 0], 0, 14 * self.day), 4)
+
+    def test_use_adds_to_decayed_score(self):
+        scores = {}
+        core.addUse(scores, "Part_Box", 0, self.day)
+        core.addUse(scores, "Part_Box", self.day, self.day)
+
+        self.assertEqual(scores["Part_Box"], [1.5, self.day])
+
+    def test_axis_slots_come_first(self):
+        layout = core.pieLayout(8, 100, 32, 24, 3)
+        order = core.slotOrder(layout["Slots"])
+        quarter = math.pi / 2
+
+        for n in order[:4]:
+            offset = layout["Slots"][n][2] % quarter
+            self.assertAlmostEqual(min(offset, quarter - offset), 0)
+
+    def test_inner_ring_comes_first(self):
+        layout = core.pieLayout(40, 100, 32, 24, 3)
+        order = core.slotOrder(layout["Slots"])
+        rings = [layout["Slots"][n][3] for n in order]
+
+        self.assertEqual(rings, sorted(rings))
+
+    def test_most_used_on_fastest_slot(self):
+        layout = core.pieLayout(8, 100, 32, 24, 3)
+        items = ["a", "b", "c", "d", "e", "f", "g", "h"]
+        scores = dict((i, 0) for i in items)
+        scores["h"] = 3
+        result = core.orderByScore(items, scores, layout["Slots"])
+
+        self.assertEqual(sorted(result), items)
+        self.assertEqual(result[core.slotOrder(layout["Slots"])[0]], "h")
+
+    def test_no_scores_keep_order(self):
+        items = ["a", "b", "c"]
+        layout = core.pieLayout(3, 100, 32, 24, 3)
+
+        self.assertEqual(core.orderByScore(items, {"a": 0, "b": 0, "c": 0},
+                                           layout["Slots"]), items)
+
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".pietrace")
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write(self, lines):
+        with open(self.path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def test_round_trip(self):
+        steps = [[0, "key", 10, 20, None],
+                 [120, "slice", "Part_Box", 40, 20],
+                 [300, "quick", "Trigger", "Hover"],
+                 [450, "clear"]]
+        core.writeTrace(self.path, steps)
+
+        self.assertEqual(core.loadTrace(self.path), steps)
+
+    def test_header_counts_steps(self):
+        core.writeTrace(self.path, [[0, "clear"]])
+
+        with open(self.path) as f:
+            header = json.loads(f.readline())
+
+        self.assertEqual(header, {"Version": core.TRACE_VERSION, "Steps": 1})
+
+    def test_old_version_is_rejected(self):
+        self.write([json.dumps({"Version": 1}), json.dumps([0, "quick", "Show"])])
+
+        with self.assertRaises(core.TraceError):
+            core.loadTrace(self.path)
+
+    def test_missing_header_is_rejected(self):
+        self.write(["not json"])
+
+        with self.assertRaises(core.TraceError):
+            core.loadTrace(self.path)
+
+    def test_invalid_step_is_rejected(self):
+        self.write([json.dumps({"Version": core.TRACE_VERSION}), json.dumps({"a": 1})])
+
+        with self.assertRaises(core.TraceError):
+            core.loadTrace(self.path)
+
+    def test_blank_lines_are_skipped(self):
+        self.write([json.dumps({"Version": core.TRACE_VERSION}), "", json.dumps([0, "clear"])])
+
+        self.assertEqual(core.loadTrace(self.path), [[0, "clear"]])
+
+
+if __name__ == "__main__":
+    unittest.main()